@@ -0,0 +1,41 @@
+"""Dataset entity data as JSONB
+
+Revision ID: 34971acdaef9
+Revises: 9052be7dc657
+Create Date: 2026-10-18 10:41:05.227816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '34971acdaef9'
+down_revision: Union[str, None] = '9052be7dc657'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.alter_column('test_dataset_entities', 'data',
+               existing_type=sa.JSON(),
+               type_=postgresql.JSONB(astext_type=sa.Text()),
+               existing_nullable=True,
+               postgresql_using='data::jsonb')
+    op.create_index('ix_test_dataset_entities_data', 'test_dataset_entities', ['data'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'data': 'jsonb_path_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_test_dataset_entities_data', table_name='test_dataset_entities',
+                  postgresql_using='gin', postgresql_ops={'data': 'jsonb_path_ops'})
+    op.alter_column('test_dataset_entities', 'data',
+               existing_type=postgresql.JSONB(astext_type=sa.Text()),
+               type_=sa.JSON(),
+               existing_nullable=True,
+               postgresql_using='data::json')
@@ -0,0 +1,55 @@
+"""Unique property names
+
+Revision ID: 51c22bfee360
+Revises: d98b57d698a9
+Create Date: 2026-10-18 15:48:13.904127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '51c22bfee360'
+down_revision: Union[str, None] = 'd98b57d698a9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # concurrent upserts could create a name twice. the duplicates are merged
+    # into the oldest property, which is the one the app resolves the name to.
+    # when a listing has values for several of them the oldest one's is kept.
+    # with LISTING_DOCUMENTS on, run rebuild_listing_documents.py afterwards
+    for table in ('test_property_values_str', 'test_property_values_bool'):
+        op.execute(f"""
+            DELETE FROM {table} AS v
+            USING test_properties AS p, {table} AS o, test_properties AS older
+            WHERE v.property_id = p.property_id
+              AND o.listing_id = v.listing_id
+              AND o.property_id = older.property_id
+              AND older.name = p.name
+              AND older.property_id < p.property_id
+        """)
+        op.execute(f"""
+            UPDATE {table} AS v SET property_id = d.keep_id
+            FROM (
+                SELECT property_id, min(property_id) OVER (PARTITION BY name) AS keep_id
+                FROM test_properties
+            ) AS d
+            WHERE v.property_id = d.property_id AND d.property_id <> d.keep_id
+        """)
+    op.execute("""
+        DELETE FROM test_properties AS p
+        USING test_properties AS o
+        WHERE o.name = p.name AND o.property_id < p.property_id
+    """)
+    op.create_unique_constraint('test_properties_name_key', 'test_properties', ['name'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('test_properties_name_key', 'test_properties', type_='unique')
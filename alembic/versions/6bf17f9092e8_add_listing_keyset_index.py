@@ -0,0 +1,28 @@
+"""Add listing keyset index
+
+Revision ID: 6bf17f9092e8
+Revises: 806ce371f995
+Create Date: 2026-10-18 09:12:31.408215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6bf17f9092e8'
+down_revision: Union[str, None] = '806ce371f995'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_test_listings_scan_date_listing_id', 'test_listings', ['scan_date', 'listing_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_test_listings_scan_date_listing_id', table_name='test_listings')
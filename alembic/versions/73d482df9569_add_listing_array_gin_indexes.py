@@ -0,0 +1,30 @@
+"""Add listing array GIN indexes
+
+Revision ID: 73d482df9569
+Revises: 34971acdaef9
+Create Date: 2026-10-18 11:20:14.630871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '73d482df9569'
+down_revision: Union[str, None] = '34971acdaef9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_test_listings_image_hashes', 'test_listings', ['image_hashes'], unique=False, postgresql_using='gin')
+    op.create_index('ix_test_listings_dataset_entity_ids', 'test_listings', ['dataset_entity_ids'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_test_listings_dataset_entity_ids', table_name='test_listings', postgresql_using='gin')
+    op.drop_index('ix_test_listings_image_hashes', table_name='test_listings', postgresql_using='gin')
@@ -0,0 +1,33 @@
+"""Partition listings by scan_date
+
+Revision ID: 8321170c7dcc
+Revises: 8b426777eec6
+Create Date: 2026-10-18 14:12:07.318254
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+
+from app.models.partitioning import listing_partitions, partition_listings, unpartition_listings
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8321170c7dcc'
+down_revision: Union[str, None] = '8b426777eec6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # opt-in: alembic -x partition_listings=true upgrade head
+    # without it test_listings stays a plain table
+    if context.get_x_argument(as_dictionary=True).get('partition_listings', '').lower() in ('1', 'true', 'yes'):
+        partition_listings(op.get_bind())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if listing_partitions(op.get_bind()) is not None:
+        unpartition_listings(op.get_bind())
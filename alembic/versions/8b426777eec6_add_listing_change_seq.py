@@ -0,0 +1,31 @@
+"""Add listing change_seq
+
+Revision ID: 8b426777eec6
+Revises: 9bc8e2ba9268
+Create Date: 2026-10-18 13:35:52.104667
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b426777eec6'
+down_revision: Union[str, None] = '9bc8e2ba9268'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # a constant default does not rewrite the table, existing listings start at 0
+    op.add_column('test_listings', sa.Column('change_seq', sa.BigInteger(), server_default='0', nullable=False))
+    op.create_index('ix_test_listings_change_seq_listing_id', 'test_listings', ['change_seq', 'listing_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_test_listings_change_seq_listing_id', table_name='test_listings')
+    op.drop_column('test_listings', 'change_seq')
@@ -0,0 +1,30 @@
+"""Add property value filter indexes
+
+Revision ID: 9052be7dc657
+Revises: 6bf17f9092e8
+Create Date: 2026-10-18 10:03:47.915342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9052be7dc657'
+down_revision: Union[str, None] = '6bf17f9092e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_test_property_values_str_property_value_listing', 'test_property_values_str', ['property_id', 'value', 'listing_id'], unique=False)
+    op.create_index('ix_test_property_values_bool_property_value_listing', 'test_property_values_bool', ['property_id', 'value', 'listing_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_test_property_values_bool_property_value_listing', table_name='test_property_values_bool')
+    op.drop_index('ix_test_property_values_str_property_value_listing', table_name='test_property_values_str')
@@ -0,0 +1,35 @@
+"""Add listing documents
+
+Revision ID: 9bc8e2ba9268
+Revises: c4d3ea7a5b72
+Create Date: 2026-10-18 12:48:09.527113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9bc8e2ba9268'
+down_revision: Union[str, None] = 'c4d3ea7a5b72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # filled by `python rebuild_listing_documents.py` before LISTING_DOCUMENTS is turned on
+    op.create_table('test_listing_documents',
+    sa.Column('listing_id', sa.String(), nullable=False),
+    sa.Column('document', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.ForeignKeyConstraint(['listing_id'], ['test_listings.listing_id'], ),
+    sa.PrimaryKeyConstraint('listing_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('test_listing_documents')
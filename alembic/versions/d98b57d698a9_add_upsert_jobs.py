@@ -0,0 +1,46 @@
+"""Add upsert jobs
+
+Revision ID: d98b57d698a9
+Revises: 8321170c7dcc
+Create Date: 2026-10-18 15:02:41.527390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'd98b57d698a9'
+down_revision: Union[str, None] = '8321170c7dcc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('test_upsert_jobs',
+    sa.Column('job_id', sa.BigInteger(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('listing_count', sa.Integer(), nullable=False),
+    sa.Column('processed_count', sa.Integer(), nullable=False),
+    sa.Column('error_count', sa.Integer(), nullable=False),
+    sa.Column('errors', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('last_error', sa.String(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('available_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.CheckConstraint("status IN ('queued', 'running', 'completed', 'failed')", name='check_upsert_job_status'),
+    sa.PrimaryKeyConstraint('job_id')
+    )
+    op.create_index('ix_test_upsert_jobs_status_available_at', 'test_upsert_jobs', ['status', 'available_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_test_upsert_jobs_status_available_at', table_name='test_upsert_jobs')
+    op.drop_table('test_upsert_jobs')
@@ -1,18 +1,58 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from typing import Optional, List
+from datetime import datetime
+import json
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
 from pydantic import ValidationError
-from app.api.schemas.listings_get import ListingsResponse, ListingFilters
+from app.api.schemas.listings_get import (
+    CountMode,
+    ListingField,
+    ListingFilters,
+    ListingOrder,
+    ListingChangesResponse,
+    ListingsBatchRequest,
+    ListingsBatchResponse,
+    ListingsResponse,
+)
 from app.api.schemas.listings_insert import ListingsInsertRequest
-from app.api.services.listings import get_listings, upsert_listings
-from app.models.database import get_db
+from app.api.schemas.upsert_jobs import UpsertJobAccepted, UpsertJobResponse
+from app.api.schemas.listings_facets import Facet, FacetsQuery, FacetsResponse, HistogramInterval
+from app.api.services.listings import (
+    CHANGES_PAGE_SIZE,
+    MAX_BATCH_IDS,
+    MAX_PAGE_SIZE,
+    PAGE_SIZE,
+    get_listing_changes,
+    get_listings_by_ids,
+    get_listings_payload,
+    get_listings_version,
+    listings_etag,
+    upsert_listings,
+)
+from app.api.services.listings_async import get_listings_payload_async, upsert_listings_async
+from app.api.services.export import export_listings, gzip_stream, EXPORT_BATCH_SIZE
+from app.api.services.ingest import NdjsonIngestor, DEFAULT_BATCH_SIZE
+from app.api.services.cache import facets_cache, listings_cache
+from app.api.services.facets import get_facets
+from app.api.exceptions.exceptions import NotFoundException
+from app.api.services.upsert_jobs import enqueue_upsert_job, get_upsert_job, max_queued_jobs, queue_depth
+from app.api.services.serialization import FastJSONResponse, use_fast_responses
+from app.models.database import (
+    get_db,
+    get_read_db,
+    get_async_db,
+    get_async_read_db,
+    pin_to_primary,
+    use_async_database,
+)
 
 router = APIRouter()
 
-@router.get("/listings", response_model=ListingsResponse)
-def retrieve_listings(
-    page: int = Query(1, ge=1),
+def listing_filters(
     listing_id: Optional[str] = Query(None),
     scan_date_from: Optional[str] = Query(None),
     scan_date_to: Optional[str] = Query(None),
@@ -20,12 +60,9 @@ def retrieve_listings(
     image_hashes: Optional[List[str]] = Query(None),
     dataset_entities: Optional[str] = Query(None, description="JSON string"),
     property_filters: Optional[str] = Query(None, description="JSON string"),
-    db: Session = Depends(get_db),
-):
+) -> ListingFilters:
+    # the filter query parameters shared by the listing read endpoints
     try:
-        import json
-        from datetime import datetime
-
         # parse dates if provided
         scan_date_from_dt = datetime.fromisoformat(scan_date_from) if scan_date_from else None
         scan_date_to_dt = datetime.fromisoformat(scan_date_to) if scan_date_to else None
@@ -34,8 +71,7 @@ def retrieve_listings(
         dataset_entities_dict = json.loads(dataset_entities) if dataset_entities else None
         property_filters_dict = json.loads(property_filters) if property_filters else None
 
-        filters = ListingFilters(
-            page=page,
+        return ListingFilters(
             listing_id=listing_id,
             scan_date_from=scan_date_from_dt,
             scan_date_to=scan_date_to_dt,
@@ -44,38 +80,329 @@ def retrieve_listings(
             dataset_entities=dataset_entities_dict,
             property_filters=property_filters_dict
         )
-
-        result = get_listings(
-            db=db,
-            filters=filters
-        )
-        return result
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=f"Invalid input: {ve}")
     except ValidationError as ve:
         raise HTTPException(status_code=422, detail=ve.errors())
+
+
+def parse_fields(fields: Optional[List[str]]) -> Optional[List[ListingField]]:
+    # `fields` repeated or comma separated
+    try:
+        return [
+            ListingField(name.strip())
+            for value in fields for name in value.split(",") if name.strip()
+        ] if fields else None
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=f"Invalid input: {ve}")
+
+
+def listing_page(
+    page: int = Query(1, ge=1),
+    page_size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description=f"Default {PAGE_SIZE}"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous next_cursor"),
+    order_by: ListingOrder = Query(ListingOrder.listing_id),
+    count: Optional[CountMode] = Query(
+        None, description="exact, estimated or none. Default exact, none on cursor pages"
+    ),
+    fields: Optional[List[str]] = Query(None, description="Fields to return, repeated or comma separated"),
+    filters: ListingFilters = Depends(listing_filters),
+) -> ListingFilters:
+    # the filters plus the pagination parameters of GET /listings
+    if cursor and page != 1:
+        raise HTTPException(status_code=400, detail="Invalid input: page and cursor cannot be combined")
+
+    return filters.model_copy(update={
+        "page": page,
+        "page_size": page_size,
+        "fields": parse_fields(fields),
+        "cursor": cursor,
+        "order_by": order_by,
+        "count": count,
+    })
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def listings_response(payload: dict, response: Response, etag: str):
+    if use_fast_responses():
+        # the services already build the ListingsResponse shape, encode it
+        # once instead of validating it again against the response_model
+        return FastJSONResponse(payload, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return payload
+
+
+def cached_listings(request: Request, response: Response, filters: ListingFilters, version: int):
+    # the ETag, and the answer when the page does not have to be loaded: a 304
+    # when nothing changed since the client's copy, or the cached body. cache
+    # entries are keyed on the version of the ETag, never a stale body under a new one
+    etag = listings_etag(version, filters)
+    if etag_matches(request, etag):
+        return etag, Response(status_code=304, headers={"ETag": etag})
+    if listings_cache.enabled:
+        payload = listings_cache.get(listings_cache.key(filters, version))
+        if payload is not None:
+            return etag, listings_response(payload, response, etag)
+    return etag, None
+
+
+def loaded_listings(payload: dict, response: Response, filters: ListingFilters, version: int, etag: str):
+    if listings_cache.enabled:
+        listings_cache.set(listings_cache.key(filters, version), payload)
+    return listings_response(payload, response, etag)
+
+
+def read_error(err: Exception) -> HTTPException:
+    if isinstance(err, ValueError):
+        return HTTPException(status_code=400, detail=f"Invalid input: {err}")
+    if isinstance(err, SQLAlchemyError):
+        return HTTPException(status_code=500, detail=f"Database error occurred. {str(err)}")
+    return HTTPException(status_code=500, detail=f"Unexpected error: {str(err)}")
+
+
+def upsert_error(err: Exception) -> HTTPException:
+    if isinstance(err, ValidationError):
+        return HTTPException(status_code=422, detail=err.errors())
+    if isinstance(err, SQLAlchemyError):
+        return HTTPException(status_code=500, detail=f"Database error during upsert. {str(err)}")
+    return HTTPException(status_code=500, detail=f"Unexpected error: {str(err)}")
+
+
+# the async and sync routes only differ in how they call the services
+if use_async_database():
+    @router.get("/listings", response_model=ListingsResponse, response_model_exclude_unset=True)
+    async def retrieve_listings(
+        request: Request,
+        response: Response,
+        filters: ListingFilters = Depends(listing_page),
+        db: AsyncSession = Depends(get_async_read_db),
+    ):
+        try:
+            version = await db.run_sync(get_listings_version)
+            etag, cached = cached_listings(request, response, filters, version)
+            if cached is not None:
+                return cached
+            payload = await get_listings_payload_async(
+                db=db,
+                filters=filters,
+                # hydrate on the same (replica or primary) engine as the page
+                session_factory=async_sessionmaker(bind=db.bind, expire_on_commit=False)
+            )
+            return loaded_listings(payload, response, filters, version, etag)
+        except Exception as e:
+            raise read_error(e)
+else:
+    @router.get("/listings", response_model=ListingsResponse, response_model_exclude_unset=True)
+    def retrieve_listings(
+        request: Request,
+        response: Response,
+        filters: ListingFilters = Depends(listing_page),
+        db: Session = Depends(get_read_db),
+    ):
+        try:
+            version = get_listings_version(db)
+            etag, cached = cached_listings(request, response, filters, version)
+            if cached is not None:
+                return cached
+            payload = get_listings_payload(db=db, filters=filters)
+            return loaded_listings(payload, response, filters, version, etag)
+        except Exception as e:
+            raise read_error(e)
+
+
+def listings_batch(db: Session, listing_ids: List[str], fields: Optional[List[ListingField]]):
+    if len(listing_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"Invalid input: at most {MAX_BATCH_IDS} listing_ids")
+    try:
+        selected = {field.value for field in fields} if fields else None
+        result = get_listings_by_ids(db, listing_ids, selected)
+        if use_fast_responses():
+            return FastJSONResponse(result)
+        return result
     except SQLAlchemyError as db_err:
         raise HTTPException(status_code=500, detail=f"Database error occurred. {str(db_err)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 
+@router.get("/listings/batch", response_model=ListingsBatchResponse, response_model_exclude_unset=True)
+def retrieve_listings_batch(
+    listing_ids: List[str] = Query(..., description=f"Repeated, at most {MAX_BATCH_IDS}"),
+    fields: Optional[List[str]] = Query(None, description="Fields to return, repeated or comma separated"),
+    db: Session = Depends(get_read_db),
+):
+    # known listings by id, in the order asked for, null for the ones not found
+    return listings_batch(db, listing_ids, parse_fields(fields))
+
 
-@router.put("/upsert")
-def upsert_listings_endpoint(
+@router.post("/listings/batch", response_model=ListingsBatchResponse, response_model_exclude_unset=True)
+def retrieve_listings_batch_body(
+    payload: ListingsBatchRequest,
+    db: Session = Depends(get_read_db),
+):
+    # same as GET /listings/batch, for id lists too long for a query string
+    return listings_batch(db, payload.listing_ids, payload.fields)
+
+
+@router.get("/listings/changes", response_model=ListingChangesResponse, response_model_exclude_unset=True)
+def retrieve_listing_changes(
+    token: Optional[str] = Query(None, description="next_token of the previous call, none starts from the beginning"),
+    limit: int = Query(CHANGES_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[List[str]] = Query(None, description="Fields to return, repeated or comma separated"),
+    db: Session = Depends(get_read_db),
+):
+    # change feed: the listings written since `token`, in the order the writes committed
+    selected = parse_fields(fields)
+    try:
+        result = get_listing_changes(db, token, limit, {field.value for field in selected} if selected else None)
+        if use_fast_responses():
+            return FastJSONResponse(result)
+        return result
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=f"Invalid input: {ve}")
+    except SQLAlchemyError as db_err:
+        raise HTTPException(status_code=500, detail=f"Database error occurred. {str(db_err)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+
+@router.get("/listings/facets", response_model=FacetsResponse, response_model_exclude_unset=True)
+def retrieve_listing_facets(
+    facets: List[Facet] = Query(..., description="Facets to count, repeated"),
+    interval: HistogramInterval = Query(HistogramInterval.day, description="scan_date bucket size"),
+    limit: int = Query(50, ge=1, le=1000, description="Values per property, entities"),
+    property_ids: Optional[List[int]] = Query(None, description="Properties to count, default all"),
+    filters: ListingFilters = Depends(listing_filters),
+    db: Session = Depends(get_read_db),
+):
+    # counts of the listings matching the filters, grouped in the database
+    query = FacetsQuery(filters=filters, facets=facets, interval=interval, limit=limit, property_ids=property_ids)
+    try:
+        cache_key = facets_cache.key(query) if facets_cache.enabled else None
+        result = facets_cache.get(cache_key) if cache_key else None
+        if result is None:
+            result = get_facets(db, query)
+            if cache_key:
+                facets_cache.set(cache_key, result)
+        return result
+    except SQLAlchemyError as db_err:
+        raise HTTPException(status_code=500, detail=f"Database error occurred. {str(db_err)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+
+@router.get("/listings/export")
+def export_listings_endpoint(
+    gzip: bool = Query(False, description="gzip-compress the stream"),
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000),
+    filters: ListingFilters = Depends(listing_filters),
+    db: Session = Depends(get_read_db),
+):
+    # every matching listing as NDJSON, streamed from a server-side cursor
+    # one batch at a time
+    lines = export_listings(db, filters, batch_size)
+    headers = {}
+    if gzip:
+        lines = gzip_stream(lines)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(lines, media_type="application/x-ndjson", headers=headers)
+
+
+
+UPSERTED = {"message": "Listings inserted/updated successfully."}
+
+
+if use_async_database():
+    @router.put("/upsert")
+    async def upsert_listings_endpoint(
+        payload: ListingsInsertRequest,
+        response: Response,
+        db: AsyncSession = Depends(get_async_db)
+    ):
+        try:
+            await upsert_listings_async(db, payload)
+        except Exception as e:
+            await db.rollback()
+            raise upsert_error(e)
+        pin_to_primary(response)
+        return UPSERTED
+else:
+    @router.put("/upsert")
+    def upsert_listings_endpoint(
+        payload: ListingsInsertRequest,
+        response: Response,
+        db: Session = Depends(get_db)
+    ):
+        try:
+            upsert_listings(db, payload)
+        except Exception as e:
+            db.rollback()
+            raise upsert_error(e)
+        pin_to_primary(response)
+        return UPSERTED
+
+
+@router.post("/upsert/jobs", status_code=202, response_model=UpsertJobAccepted)
+def enqueue_upsert_job_endpoint(
     payload: ListingsInsertRequest,
+    response: Response,
     db: Session = Depends(get_db)
 ):
+    # the payload is stored and applied by the job workers, poll GET /upsert/jobs/{job_id}
     try:
-        upsert_listings(db, payload)
-        return {"message": "Listings inserted/updated successfully."}
-    except ValidationError as ve:
-        db.rollback()
-        raise HTTPException(status_code=422, detail=ve.errors())
+        depth = queue_depth(db)
+        if depth >= max_queued_jobs():
+            raise HTTPException(
+                status_code=429,
+                detail=f"{depth} upsert jobs are waiting, try again later.",
+                headers={"Retry-After": "5"}
+            )
+        job_id = enqueue_upsert_job(db, payload)
+        pin_to_primary(response)
+        return {"job_id": job_id, "status": "queued", "queue_depth": depth + 1}
+    except HTTPException:
+        raise
     except SQLAlchemyError as db_err:
         db.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error during upsert. {str(db_err)}")
+        raise HTTPException(status_code=500, detail=f"Database error while queueing the upsert. {str(db_err)}")
+
+
+@router.get("/upsert/jobs/{job_id}", response_model=UpsertJobResponse)
+def retrieve_upsert_job(job_id: int, db: Session = Depends(get_db)):
+    job = get_upsert_job(db, job_id)
+    if job is None:
+        raise NotFoundException(f"Upsert job {job_id} not found.")
+    return job
+
+
+@router.post("/ingest")
+async def ingest_ndjson_endpoint(
+    request: Request,
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    # application/x-ndjson body, one InsertListingSchema per line,
+    # parsed while it streams in and committed batch by batch
+    ingestor = NdjsonIngestor(db, batch_size)
+    try:
+        pending = b""
+        async for chunk in request.stream():
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                if ingestor.add_line(line):
+                    await run_in_threadpool(ingestor.flush)
+        if pending:
+            ingestor.add_line(pending)
+        await run_in_threadpool(ingestor.flush)
+        return ingestor.report()
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
-
@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+from app.api.services.cache import facets_cache, listings_cache
+from app.api.services.registry import properties_by_name, properties_by_id, entities_by_name
+from app.models.database import get_pool_metrics
+
+router = APIRouter()
+
+@router.get("/metrics")
+def retrieve_metrics():
+    return {
+        "pools": get_pool_metrics(),
+        "registries": {
+            "properties_by_name": properties_by_name.stats(),
+            "properties_by_id": properties_by_id.stats(),
+            "entities_by_name": entities_by_name.stats(),
+        },
+        "listings_cache": listings_cache.stats(),
+        "facets_cache": facets_cache.stats(),
+    }
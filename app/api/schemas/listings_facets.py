@@ -0,0 +1,66 @@
+from enum import Enum
+from typing import Optional, List, Union
+from pydantic import BaseModel
+from datetime import datetime
+
+from app.api.schemas.listings_get import ListingFilters, PropertyType
+
+
+class Facet(str, Enum):
+    is_active = "is_active"
+    properties = "properties"
+    entities = "entities"
+    scan_date = "scan_date"
+
+
+class HistogramInterval(str, Enum):
+    hour = "hour"
+    day = "day"
+    week = "week"
+    month = "month"
+    year = "year"
+
+
+class FacetsQuery(BaseModel):
+    filters: ListingFilters
+    facets: List[Facet]
+    interval: HistogramInterval = HistogramInterval.day
+    limit: int = 50  # values per property, entities
+    property_ids: Optional[List[int]] = None  # None counts every property
+
+
+class ActiveCount(BaseModel):
+    value: Optional[bool]
+    count: int
+
+
+class PropertyValueCount(BaseModel):
+    value: Union[str, bool]
+    count: int
+
+
+class PropertyFacet(BaseModel):
+    property_id: int
+    name: str
+    type: PropertyType
+    values: List[PropertyValueCount]  # most frequent first
+
+
+class EntityCount(BaseModel):
+    entity_id: int
+    name: str
+    count: int
+
+
+class ScanDateBucket(BaseModel):
+    bucket: datetime  # start of the interval
+    count: int
+
+
+class FacetsResponse(BaseModel):
+    # only the requested facets are returned
+    total: int
+    is_active: Optional[List[ActiveCount]] = None
+    properties: Optional[List[PropertyFacet]] = None
+    entities: Optional[List[EntityCount]] = None
+    scan_date: Optional[List[ScanDateBucket]] = None
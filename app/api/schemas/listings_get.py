@@ -9,6 +9,28 @@ class PropertyType(str, Enum):
     boolean = "bool"
 
 
+class ListingOrder(str, Enum):
+    listing_id = "listing_id"
+    scan_date = "scan_date"  # (scan_date, listing_id)
+
+
+class ListingField(str, Enum):
+    # what `fields` can select, listing_id is always returned
+    listing_id = "listing_id"
+    scan_date = "scan_date"
+    is_active = "is_active"
+    dataset_entity_ids = "dataset_entity_ids"
+    image_hashes = "image_hashes"
+    properties = "properties"
+    entities = "entities"
+
+
+class CountMode(str, Enum):
+    exact = "exact"
+    estimated = "estimated"  # planner row estimate, cheap but approximate
+    none = "none"
+
+
 class ListingPropertySchema(BaseModel):
     name: str
     type: PropertyType  # 'str' or 'bool'
@@ -21,22 +43,29 @@ class DatasetEntitySchema(BaseModel):
 
 
 class ListingResponseSchema(BaseModel):
+    # every field but listing_id is left out when not selected by `fields`
     listing_id: str
-    scan_date: datetime
-    is_active: bool
-    dataset_entity_ids: List[int]
-    image_hashes: List[str]
-    properties: List[ListingPropertySchema]
-    entities: List[DatasetEntitySchema]
+    scan_date: Optional[datetime] = None
+    is_active: Optional[bool] = None
+    dataset_entity_ids: Optional[List[int]] = None
+    image_hashes: Optional[List[str]] = None
+    properties: Optional[List[ListingPropertySchema]] = None
+    entities: Optional[List[DatasetEntitySchema]] = None
 
 
 class ListingsResponse(BaseModel):
-    total: int
+    total: Optional[int] = None  # None when counting is disabled
     listings: List[ListingResponseSchema]
+    next_cursor: Optional[str] = None  # opaque, pass back as `cursor` to get the next page
 
 
 class ListingFilters(BaseModel):
     page: Optional[int] = 1
+    page_size: Optional[int] = None  # PAGE_SIZE when not given
+    fields: Optional[List[ListingField]] = None  # None returns every field
+    cursor: Optional[str] = None
+    order_by: ListingOrder = ListingOrder.listing_id
+    count: Optional[CountMode] = None  # exact, none on cursor pages
     listing_id: Optional[str] = None
     scan_date_from: Optional[datetime] = None
     scan_date_to: Optional[datetime] = None
@@ -44,3 +73,19 @@ class ListingFilters(BaseModel):
     image_hashes: Optional[List[str]] = None
     dataset_entities:  Optional[Dict[str, Any]] = None
     property_filters: Optional[Dict[int, Union[str, bool]]] = None
+
+
+class ListingsBatchRequest(BaseModel):
+    listing_ids: List[str]
+    fields: Optional[List[ListingField]] = None  # None returns every field
+
+
+class ListingsBatchResponse(BaseModel):
+    listings: List[Optional[ListingResponseSchema]]  # in request order, null when not found
+    missing: List[str]
+
+
+class ListingChangesResponse(BaseModel):
+    listings: List[ListingResponseSchema]  # oldest change first
+    next_token: str  # pass back as `token` to continue, also when nothing changed yet
+    has_more: bool  # false once caught up
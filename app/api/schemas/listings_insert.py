@@ -1,7 +1,7 @@
 from enum import Enum
 from typing import List, Union, Dict, Any
-from pydantic import BaseModel
-from datetime import datetime
+from pydantic import BaseModel, field_validator
+from datetime import datetime, timezone
 
 class PropertyType(str, Enum):
     string = "str"
@@ -27,6 +27,15 @@ class InsertListingSchema(BaseModel):
     properties: List[InsertPropertySchema]
     entities: List[InsertEntitySchema]
 
+    @field_validator("scan_date")
+    @classmethod
+    def scan_date_utc(cls, value: datetime) -> datetime:
+        # stored as naive UTC, whatever offset the client sent. the monthly
+        # partition is picked from this value too
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
 
 class ListingsInsertRequest(BaseModel):
     listings: List[InsertListingSchema]
\ No newline at end of file
@@ -0,0 +1,36 @@
+from enum import Enum
+from typing import Optional, List
+from pydantic import BaseModel
+from datetime import datetime
+
+
+class UpsertJobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    completed = "completed"  # every listing was tried, see errors
+    failed = "failed"
+
+
+class UpsertJobAccepted(BaseModel):
+    job_id: int
+    status: UpsertJobStatus
+    queue_depth: int  # queued and running jobs, this one included
+
+
+class ListingError(BaseModel):
+    listing_id: str
+    error: str
+
+
+class UpsertJobResponse(BaseModel):
+    job_id: int
+    status: UpsertJobStatus
+    listing_count: int
+    processed_count: int  # listings applied or rejected so far
+    error_count: int
+    errors: List[ListingError]  # the first ones only
+    last_error: Optional[str] = None
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
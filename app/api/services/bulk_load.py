@@ -0,0 +1,212 @@
+import io
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from app.api.schemas.listings_insert import InsertListingSchema
+from app.api.services.cache import facets_cache, listings_cache
+from app.api.services.ingest import NdjsonIngestor
+from app.api.services.listings import lock_listing_ids, lock_listings, mark_listings_changed
+from app.models.partitioning import ensure_partitions
+
+DEFAULT_CHUNK_SIZE = 10000
+
+# bulk loads for backfills: every chunk of validated listings is COPYed into a
+# temporary staging table as one jsonb per listing, then merged into the listing
+# tables with one set-based statement per table and committed. the merge keeps
+# the upsert semantics, the last occurrence of a listing, entity or property
+# value wins and change_seq / the listings version are set as by an upsert
+
+STAGING_TABLES = (
+    "CREATE TEMP TABLE IF NOT EXISTS bulk_listings (position integer NOT NULL, listing jsonb NOT NULL) "
+    "ON COMMIT DELETE ROWS",
+    # the deduplicated listing rows, with entity names resolved to ids
+    "CREATE TEMP TABLE IF NOT EXISTS bulk_listing_rows ("
+    "listing_id varchar PRIMARY KEY, scan_date timestamp, is_active boolean, "
+    "image_hashes varchar[], dataset_entity_ids integer[]) ON COMMIT DELETE ROWS",
+)
+
+COPY_LISTINGS = "COPY bulk_listings (position, listing) FROM STDIN"
+
+MERGE_ENTITIES = """
+INSERT INTO test_dataset_entities (name, data)
+SELECT name, data FROM (
+    SELECT DISTINCT ON (entity->>'name') entity->>'name' AS name, entity->'data' AS data
+    FROM bulk_listings
+    CROSS JOIN LATERAL jsonb_array_elements(listing->'entities') WITH ORDINALITY AS entities (entity, n)
+    ORDER BY entity->>'name', position DESC, n DESC
+) AS latest
+ORDER BY name
+ON CONFLICT (name) DO UPDATE SET data = excluded.data
+WHERE test_dataset_entities.data IS DISTINCT FROM excluded.data
+RETURNING entity_id
+"""
+
+# a property is created with the type it first appears with
+MERGE_PROPERTIES = """
+INSERT INTO test_properties (name, type)
+SELECT name, type FROM (
+    SELECT DISTINCT ON (prop->>'name')
+        prop->>'name' AS name,
+        CASE prop->>'type' WHEN 'str' THEN 'string' ELSE 'boolean' END AS type,
+        position, n
+    FROM bulk_listings
+    CROSS JOIN LATERAL jsonb_array_elements(listing->'properties') WITH ORDINALITY AS props (prop, n)
+    ORDER BY prop->>'name', position, n
+) AS first_seen
+WHERE NOT EXISTS (SELECT 1 FROM test_properties WHERE test_properties.name = first_seen.name)
+ORDER BY name
+ON CONFLICT (name) DO NOTHING
+"""
+
+# scan_date is staged as naive UTC, InsertListingSchema converts any offset
+# the way it does for an upsert, so the plain timestamp cast keeps it as is
+STAGE_LISTING_ROWS = """
+INSERT INTO bulk_listing_rows
+SELECT DISTINCT ON (listing->>'listing_id')
+    listing->>'listing_id',
+    (listing->>'scan_date')::timestamp,
+    (listing->>'is_active')::boolean,
+    ARRAY(SELECT jsonb_array_elements_text(listing->'image_hashes')),
+    ARRAY(
+        SELECT entities.entity_id
+        FROM jsonb_array_elements(listing->'entities') WITH ORDINALITY AS names (entity, n)
+        JOIN test_dataset_entities AS entities ON entities.name = names.entity->>'name'
+        ORDER BY names.n
+    )
+FROM bulk_listings
+ORDER BY listing->>'listing_id', position DESC
+"""
+
+MERGE_LISTINGS = """
+INSERT INTO test_listings (listing_id, scan_date, is_active, image_hashes, dataset_entity_ids)
+SELECT listing_id, scan_date, is_active, image_hashes, dataset_entity_ids
+FROM bulk_listing_rows ORDER BY listing_id
+ON CONFLICT (listing_id) DO UPDATE SET
+    scan_date = excluded.scan_date,
+    is_active = excluded.is_active,
+    image_hashes = excluded.image_hashes,
+    dataset_entity_ids = excluded.dataset_entity_ids
+"""
+
+# a partitioned test_listings has nothing to conflict on, see _write_listings
+UPDATE_PARTITIONED_LISTINGS = """
+UPDATE test_listings SET
+    scan_date = rows.scan_date,
+    is_active = rows.is_active,
+    image_hashes = rows.image_hashes,
+    dataset_entity_ids = rows.dataset_entity_ids
+FROM bulk_listing_rows AS rows
+WHERE test_listings.listing_id = rows.listing_id
+"""
+
+INSERT_PARTITIONED_LISTINGS = """
+INSERT INTO test_listings (listing_id, scan_date, is_active, image_hashes, dataset_entity_ids)
+SELECT listing_id, scan_date, is_active, image_hashes, dataset_entity_ids
+FROM bulk_listing_rows AS rows
+WHERE NOT EXISTS (SELECT 1 FROM test_listings WHERE test_listings.listing_id = rows.listing_id)
+ORDER BY listing_id
+"""
+
+MERGE_VALUES = """
+INSERT INTO {table} (listing_id, property_id, value)
+SELECT DISTINCT ON (listing->>'listing_id', properties.property_id)
+    listing->>'listing_id', properties.property_id, {value}
+FROM bulk_listings
+CROSS JOIN LATERAL jsonb_array_elements(listing->'properties') WITH ORDINALITY AS props (prop, n)
+JOIN test_properties AS properties ON properties.name = prop->>'name'
+WHERE prop->>'type' = '{prop_type}'
+ORDER BY listing->>'listing_id', properties.property_id, position DESC, n DESC
+ON CONFLICT (listing_id, property_id) DO UPDATE SET value = excluded.value
+"""
+
+VALUE_TABLES = (
+    ("str", "test_property_values_str", "prop->>'value'"),
+    ("bool", "test_property_values_bool", "(prop->>'value')::boolean"),
+)
+
+
+def copy_line(position: int, listing: InsertListingSchema) -> str:
+    # COPY text format, json never has raw tabs or newlines but its escapes need escaping
+    line = listing.model_dump_json().replace("\\", "\\\\")
+    return f"{position}\t{line}\n"
+
+
+def bulk_load_listings(db: Session, listings: List[InsertListingSchema]) -> Dict[str, int]:
+    # one chunk, one transaction. returns the rows written per table
+    if not listings:
+        return {}
+
+    partitioned = ensure_partitions(db, (listing.scan_date for listing in listings))
+    for statement in STAGING_TABLES:
+        db.execute(text(statement))
+    # empty after every commit, unless the caller's transaction spans several chunks
+    db.execute(text("TRUNCATE bulk_listings, bulk_listing_rows"))
+
+    buffer = io.StringIO()
+    for position, listing in enumerate(listings):
+        buffer.write(copy_line(position, listing))
+    buffer.seek(0)
+    raw_connection = db.connection().connection
+    cursor = raw_connection.cursor()
+    try:
+        cursor.copy_expert(COPY_LISTINGS, buffer)
+    except raw_connection.Error as err:
+        raise DBAPIError.instance(COPY_LISTINGS, None, err, raw_connection.Error)
+    finally:
+        cursor.close()
+
+    rows = {}
+    changed_entity_ids = db.execute(text(MERGE_ENTITIES)).scalars().all()
+    rows["test_dataset_entities"] = len(changed_entity_ids)
+    rows["test_properties"] = db.execute(text(MERGE_PROPERTIES)).rowcount
+    db.execute(text(STAGE_LISTING_ROWS))
+    listing_ids = db.execute(text("SELECT listing_id FROM bulk_listing_rows ORDER BY listing_id")).scalars().all()
+    touched_ids = lock_listings(db, listing_ids, changed_entity_ids)
+    if partitioned:
+        lock_listing_ids(db, listing_ids)
+        rows["test_listings"] = (
+            db.execute(text(UPDATE_PARTITIONED_LISTINGS)).rowcount
+            + db.execute(text(INSERT_PARTITIONED_LISTINGS)).rowcount
+        )
+    else:
+        rows["test_listings"] = db.execute(text(MERGE_LISTINGS)).rowcount
+    for prop_type, table, value in VALUE_TABLES:
+        rows[table] = db.execute(text(MERGE_VALUES.format(table=table, value=value, prop_type=prop_type))).rowcount
+
+    mark_listings_changed(db, touched_ids)
+    db.commit()
+
+    listings_cache.invalidate()
+    facets_cache.invalidate()
+    return rows
+
+
+class BulkLoader(NdjsonIngestor):
+    # the NDJSON ingestor with the chunks COPYed and merged instead of upserted,
+    # only the current chunk is held in memory
+    def __init__(self, db: Session, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        super().__init__(db, chunk_size)
+        self.rows = 0
+        self.chunk_rows: Dict[str, int] = {}
+
+    def write(self, listings: List[InsertListingSchema]):
+        self.chunk_rows = bulk_load_listings(self.db, listings)
+        self.rows += sum(self.chunk_rows.values())
+
+    def flush(self) -> Optional[Dict[str, Any]]:
+        self.chunk_rows = {}
+        stats = super().flush()
+        if stats is not None:
+            rows = sum(self.chunk_rows.values())
+            stats["rows"] = rows
+            stats["rows_per_second"] = round(rows / stats["seconds"], 1) if stats["seconds"] else None
+        return stats
+
+    def report(self) -> Dict[str, Any]:
+        report = super().report()
+        report["rows"] = self.rows
+        report["rows_per_second"] = round(self.rows / report["seconds"], 1) if report["seconds"] else None
+        return report
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+from app.api.services.serialization import dumps
+
+
+def filters_digest(filters: BaseModel) -> str:
+    # equal for filters that select the same page, whatever their order
+    params = filters.model_dump(mode="json")
+    if params.get("image_hashes"):
+        params["image_hashes"] = sorted(set(params["image_hashes"]))
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+class CacheBackend(ABC):
+    # the storage of a ResponseCache: values are JSON-serialisable objects,
+    # datetimes included. one backend can hold several caches, told apart by
+    # the prefix of their keys
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: float):
+        ...
+
+    @abstractmethod
+    def get_counter(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    def incr(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    def clear(self, prefix: str = ""):
+        # drops the entries and counters whose key starts with prefix
+        ...
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class MemoryCacheBackend(CacheBackend):
+    # process-local LRU with a per-entry expiry and a bound on the entry count
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self, prefix: str = ""):
+        with self._lock:
+            for store in (self._entries, self._counters):
+                for key in [key for key in store if key.startswith(prefix)]:
+                    del store[key]
+
+    def size(self) -> Optional[int]:
+        return len(self._entries)
+
+
+class RedisCacheBackend(CacheBackend):
+    # any Redis-compatible server or stand-in (e.g. fakeredis). entries and the
+    # generation counter are shared by every API process using it
+    def __init__(self, client=None, url: str = "redis://localhost:6379/0"):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("LISTINGS_CACHE_BACKEND=redis needs the `redis` package")
+            client = redis.Redis.from_url(url)
+        self.client = client
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: float):
+        self.client.set(key, dumps(value), px=max(int(ttl * 1000), 1))
+
+    def get_counter(self, key: str) -> int:
+        raw = self.client.get(key)
+        return int(raw) if raw is not None else 0
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(key))
+
+    def clear(self, prefix: str = ""):
+        # SCAN rather than FLUSHDB, the server may hold other caches or data
+        keys = list(self.client.scan_iter(match=f"{prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+class ResponseCache:
+    # results keyed on the normalised filters (pagination included) and on a
+    # generation counter: bumping the generation after a write makes every
+    # cached entry unreachable at once. a caller that already read a version of
+    # the data (the listings ETag) keys on that instead, so the entry can never
+    # be older than the version it is served with
+    def __init__(self, backend: Optional[CacheBackend], ttl: float = 30, namespace: str = "listings"):
+        self.backend = backend
+        self.ttl = ttl
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def key(self, filters: BaseModel, version: Optional[int] = None) -> str:
+        digest = filters_digest(filters)
+        if version is None:
+            version = self.backend.get_counter(f"{self.namespace}:generation")
+        return f"{self.namespace}:{version}:{digest}"
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any):
+        self.backend.set(key, value, self.ttl)
+
+    def invalidate(self):
+        if self.enabled:
+            self.backend.incr(f"{self.namespace}:generation")
+
+    def clear(self):
+        if self.enabled:
+            self.backend.clear(f"{self.namespace}:")
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": self.backend.size() if self.enabled else 0,
+        }
+
+
+def create_cache_backend(prefix: str = "LISTINGS_CACHE") -> Optional[CacheBackend]:
+    # <prefix>_BACKEND is memory (default), redis or none
+    backend = os.getenv(f"{prefix}_BACKEND", "memory").lower()
+    if backend == "none":
+        return None
+    if backend == "redis":
+        return RedisCacheBackend(url=os.getenv(f"{prefix}_REDIS_URL", "redis://localhost:6379/0"))
+    return MemoryCacheBackend(max_entries=int(os.getenv(f"{prefix}_MAX_ENTRIES", "1024")))
+
+
+listings_cache = ResponseCache(
+    create_cache_backend(),
+    ttl=float(os.getenv("LISTINGS_CACHE_TTL_SECONDS", "30")),
+)
+
+# facet counts are the most expensive reads, worth caching even for a few seconds
+facets_cache = ResponseCache(
+    create_cache_backend("FACETS_CACHE"),
+    ttl=float(os.getenv("FACETS_CACHE_TTL_SECONDS", "10")),
+    namespace="facets",
+)
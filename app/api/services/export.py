@@ -0,0 +1,30 @@
+import zlib
+from typing import Iterable, Iterator
+
+from sqlalchemy.orm import Session
+
+from app.api.schemas.listings_get import ListingFilters
+from app.api.services.listings import filter_listings, hydrate_listings
+from app.api.services.serialization import dumps
+from app.models.schemas import Listing
+
+EXPORT_BATCH_SIZE = 1000
+
+
+def export_listings(db: Session, filters: ListingFilters, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    # one NDJSON chunk per batch: rows come from a server-side cursor
+    # (stream_results) and each batch is hydrated with the page queries
+    statement = filter_listings(db, filters).order_by(Listing.listing_id).statement
+    result = db.execute(statement.execution_options(yield_per=batch_size))
+
+    for listings in result.scalars().partitions():
+        yield b"".join(dumps(listing) + b"\n" for listing in hydrate_listings(db, listings))
+
+
+def gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        # sync flush so every batch reaches the client right away
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
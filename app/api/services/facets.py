@@ -0,0 +1,116 @@
+from typing import Any, Dict, List
+
+from sqlalchemy import distinct, func, select
+from sqlalchemy.orm import Session
+
+from app.api.schemas.listings_facets import Facet, FacetsQuery
+from app.api.services.listings import filter_listings
+from app.api.services.registry import lookup_properties_by_id
+from app.models.schemas import BoolPropertyValue, DatasetEntity, Listing, StringPropertyValue
+
+
+# facet counts over the listings matching the filters, one GROUP BY query per
+# facet. they all read the filtered listings through the same subquery
+
+
+def get_facets(db: Session, query: FacetsQuery) -> Dict[str, Any]:
+    matching = filter_listings(db, query.filters).with_entities(
+        Listing.listing_id, Listing.scan_date, Listing.is_active, Listing.dataset_entity_ids
+    ).subquery()
+
+    result: Dict[str, Any] = {
+        "total": db.execute(select(func.count()).select_from(matching)).scalar()
+    }
+    facets = set(query.facets)
+
+    if Facet.is_active in facets:
+        rows = db.execute(
+            select(matching.c.is_active, func.count())
+            .group_by(matching.c.is_active)
+            .order_by(matching.c.is_active)
+        ).all()
+        result["is_active"] = [{"value": value, "count": count} for value, count in rows]
+
+    if Facet.properties in facets:
+        result["properties"] = property_facets(db, matching, query)
+
+    if Facet.entities in facets:
+        result["entities"] = entity_facets(db, matching, query.limit)
+
+    if Facet.scan_date in facets:
+        bucket = func.date_trunc(query.interval.value, matching.c.scan_date).label("bucket")
+        rows = db.execute(
+            select(bucket, func.count())
+            .where(matching.c.scan_date.is_not(None))
+            .group_by(bucket)
+            .order_by(bucket)
+        ).all()
+        result["scan_date"] = [{"bucket": bucket, "count": count} for bucket, count in rows]
+
+    return result
+
+
+def property_facets(db: Session, matching, query: FacetsQuery) -> List[Dict[str, Any]]:
+    values: Dict[int, List[Dict[str, Any]]] = {}
+    types: Dict[int, str] = {}
+    for prop_type, value_table in (("str", StringPropertyValue), ("bool", BoolPropertyValue)):
+        count = func.count()
+        counts = (
+            select(
+                value_table.property_id,
+                value_table.value,
+                count.label("count"),
+                # the `limit` most frequent values of every property
+                func.row_number().over(
+                    partition_by=value_table.property_id,
+                    order_by=(count.desc(), value_table.value)
+                ).label("rank"),
+            )
+            .join(matching, matching.c.listing_id == value_table.listing_id)
+            .group_by(value_table.property_id, value_table.value)
+        )
+        if query.property_ids is not None:
+            counts = counts.where(value_table.property_id.in_(query.property_ids))
+        counts = counts.subquery()
+
+        rows = db.execute(
+            select(counts.c.property_id, counts.c.value, counts.c.count)
+            .where(counts.c.rank <= query.limit)
+            .order_by(counts.c.property_id, counts.c.rank)
+        ).all()
+        for property_id, value, value_count in rows:
+            types[property_id] = prop_type
+            values.setdefault(property_id, []).append({"value": value, "count": value_count})
+
+    property_names = lookup_properties_by_id(db, values)
+    return [
+        {
+            "property_id": property_id,
+            "name": property_names[property_id][0],
+            "type": types[property_id],
+            "values": property_values,
+        }
+        for property_id, property_values in sorted(values.items())
+        if property_id in property_names
+    ]
+
+
+def entity_facets(db: Session, matching, limit: int) -> List[Dict[str, Any]]:
+    # a listing counts once per entity, even if its array repeats the id
+    references = select(
+        matching.c.listing_id, func.unnest(matching.c.dataset_entity_ids).label("entity_id")
+    ).subquery()
+    count = func.count(distinct(references.c.listing_id))
+    counts = (
+        select(references.c.entity_id, count.label("count"))
+        .group_by(references.c.entity_id)
+        .order_by(count.desc(), references.c.entity_id)
+        .limit(limit)
+        .subquery()
+    )
+    rows = db.execute(
+        select(counts.c.entity_id, DatasetEntity.name, counts.c.count)
+        .join(DatasetEntity, DatasetEntity.entity_id == counts.c.entity_id)
+        .order_by(counts.c.count.desc(), counts.c.entity_id)
+    ).all()
+    return [{"entity_id": entity_id, "name": name, "count": entity_count} for entity_id, name, entity_count in rows]
@@ -0,0 +1,95 @@
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.api.schemas.listings_insert import InsertListingSchema, ListingsInsertRequest
+from app.api.services.listings import upsert_listings
+
+DEFAULT_BATCH_SIZE = 500
+# only the first rejections and batches are kept in the report, the rest are counted
+MAX_REPORTED_REJECTIONS = 100
+MAX_REPORTED_BATCHES = 1000
+
+
+class NdjsonIngestor:
+    # parses one InsertListingSchema per line and upserts them in micro-batches,
+    # only the current batch is held in memory
+    def __init__(self, db: Session, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.batch: List[Tuple[int, InsertListingSchema]] = []
+        self.line_no = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.rejections: List[Dict[str, Any]] = []
+        self.batch_count = 0
+        self.batches: List[Dict[str, Any]] = []
+        self.started = time.perf_counter()
+
+    def add_line(self, line: Union[str, bytes]) -> bool:
+        # returns True once the batch is full and should be flushed
+        self.line_no += 1
+        if not line.strip():
+            return False
+        try:
+            listing = InsertListingSchema.model_validate_json(line)
+        except ValidationError as ve:
+            self._reject(self.line_no, ve.errors(include_url=False, include_context=False, include_input=False))
+            return False
+        self.batch.append((self.line_no, listing))
+        return len(self.batch) >= self.batch_size
+
+    def flush(self) -> Optional[Dict[str, Any]]:
+        if not self.batch:
+            return None
+        batch, self.batch = self.batch, []
+
+        started = time.perf_counter()
+        error = None
+        try:
+            self.write([listing for _, listing in batch])
+            self.accepted += len(batch)
+        except SQLAlchemyError as db_err:
+            self.db.rollback()
+            error = f"Database error during upsert. {str(db_err)}"
+            for line_no, _ in batch:
+                self._reject(line_no, error)
+        seconds = time.perf_counter() - started
+
+        self.batch_count += 1
+        stats = {
+            "batch": self.batch_count,
+            "first_line": batch[0][0],
+            "last_line": batch[-1][0],
+            "listings": len(batch),
+            "seconds": round(seconds, 4),
+            "listings_per_second": round(len(batch) / seconds, 1) if seconds else None,
+            "error": error,
+        }
+        if len(self.batches) < MAX_REPORTED_BATCHES:
+            self.batches.append(stats)
+        return stats
+
+    def write(self, listings: List[InsertListingSchema]):
+        upsert_listings(self.db, ListingsInsertRequest(listings=listings))
+
+    def report(self) -> Dict[str, Any]:
+        seconds = time.perf_counter() - self.started
+        return {
+            "lines": self.line_no,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "seconds": round(seconds, 4),
+            "listings_per_second": round(self.accepted / seconds, 1) if seconds else None,
+            "batch_count": self.batch_count,
+            "batches": self.batches,
+            "rejections": self.rejections,
+        }
+
+    def _reject(self, line_no: int, error: Any):
+        self.rejected += 1
+        if len(self.rejections) < MAX_REPORTED_REJECTIONS:
+            self.rejections.append({"line": line_no, "error": error})
@@ -1,5 +1,11 @@
-from typing import Dict, Any
-from sqlalchemy.orm import Session
+import base64
+import binascii
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session, contains_eager, load_only
 from app.api.schemas.listings_insert import ListingsInsertRequest
 from app.models.schemas import (
     Listing,
@@ -7,16 +13,35 @@ from app.models.schemas import (
     BoolPropertyValue,
     DatasetEntity,
     Property,
+    ListingDocument,
+    ListingsVersion,
 )
-from app.api.schemas.listings_get import ListingsResponse, ListingFilters
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy import any_, cast, or_
+from app.api.services.registry import (
+    entities_by_name,
+    lookup_entities_by_name,
+    lookup_properties_by_id,
+    lookup_properties_by_name,
+    remember_properties,
+)
+from app.models.partitioning import ensure_partitions
+from app.api.services.cache import facets_cache, filters_digest, listings_cache
+from app.api.schemas.listings_get import ListingsResponse, ListingFilters, ListingOrder, CountMode
+from sqlalchemy import String, and_, any_, bindparam, exists, func, or_, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
 
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_IDS = 1000
+CHANGES_PAGE_SIZE = 500
+DOCUMENT_BATCH_SIZE = 500
 
-def get_listings(
-    db: Session,
-    filters: ListingFilters
-) -> Dict[str, Any]:
+# the scalar columns of a listing in the response, in response order
+LISTING_COLUMNS = ("scan_date", "is_active", "dataset_entity_ids", "image_hashes")
+
+
+def filter_listings(db: Session, filters: ListingFilters):
     query = db.query(Listing)
 
     # filters on Listings table
@@ -34,177 +59,727 @@ def get_listings(
 
     if filters.image_hashes:
         # any overlap between image_hashes arrays
-        query = query.filter(
-            #Listing.image_hashes.overlap(filters.image_hashes)
-            or_(*(image_hash == any_(Listing.image_hashes) for image_hash in filters.image_hashes))
-        )
+        query = query.filter(Listing.image_hashes.overlap(filters.image_hashes))
 
     if filters.dataset_entities:
-        # step 1: find all entity_ids whose `data` JSON contains the given dataset_entities dict
-        matching_entities = db.query(DatasetEntity.entity_id).filter(
-            cast(DatasetEntity.data, JSONB).op('@>')(filters.dataset_entities)
-        ).all()
-        matching_entity_ids = [e[0] for e in matching_entities]
+        # entities whose `data` contains the given dict, resolved in the same statement
+        matching_entity_ids = select(func.array_agg(DatasetEntity.entity_id)).where(
+            DatasetEntity.data.contains(filters.dataset_entities)
+        ).scalar_subquery()
 
-        if matching_entity_ids:
-            # step 2: filter listings whose dataset_entity_ids array overlaps with these matching entity_ids
-            query = query.filter(Listing.dataset_entity_ids.overlap(matching_entity_ids))
-        else:
-            # if no entities match, return early with empty result
-            return ListingsResponse(listings=[], total=0)
+        # listings whose dataset_entity_ids array overlaps with these entity_ids
+        query = query.filter(Listing.dataset_entity_ids.overlap(matching_entity_ids))
 
     if filters.property_filters:
-        listing_ids_sets = []
-
+        # one correlated EXISTS per property, evaluated inside the listing query
         for prop_id, expected_value in filters.property_filters.items():
             if isinstance(expected_value, str):
-                subquery = db.query(StringPropertyValue.listing_id).filter(
-                    StringPropertyValue.property_id == prop_id,
-                    StringPropertyValue.value == expected_value
-                )
+                value_table = StringPropertyValue
             elif isinstance(expected_value, bool):
-                subquery = db.query(BoolPropertyValue.listing_id).filter(
-                    BoolPropertyValue.property_id == prop_id,
-                    BoolPropertyValue.value == expected_value
-                )
+                value_table = BoolPropertyValue
             else:
                 continue  # skip unsupported types
 
-            listing_ids = {row[0] for row in subquery.all()}
-            listing_ids_sets.append(listing_ids)
+            query = query.filter(
+                exists().where(
+                    value_table.listing_id == Listing.listing_id,
+                    value_table.property_id == prop_id,
+                    value_table.value == expected_value
+                )
+            )
+
+    return query
+
+
+def get_listings(
+    db: Session,
+    filters: ListingFilters
+) -> ListingsResponse:
+    return ListingsResponse(**get_listings_payload(db, filters))
+
+
+def get_listings_payload(
+    db: Session,
+    filters: ListingFilters
+) -> Dict[str, Any]:
+    # the ListingsResponse as plain dicts, for the routes that encode it directly
+    listings, total_count, next_cursor = fetch_listings_page(db, filters)
+
+    results = listing_results(db, listings, selected_fields(filters))
+
+    return {"total": total_count, "listings": results, "next_cursor": next_cursor}
+
+
+def fetch_listings_page(
+    db: Session,
+    filters: ListingFilters
+) -> Tuple[List[Listing], Optional[int], Optional[str]]:
+    query = filter_listings(db, filters)
+    page_size = filters.page_size or PAGE_SIZE
+
+    if filters.order_by == ListingOrder.scan_date:
+        page_query = query.order_by(Listing.scan_date, Listing.listing_id)
+    else:
+        page_query = query.order_by(Listing.listing_id)
+
+    page_query = with_documents(page_query)
+
+    if filters.cursor:
+        # keyset pagination: continue right after the last row of the previous page
+        page_query = page_query.filter(_after_cursor(filters.cursor, filters.order_by))
+    else:
+        page_query = page_query.offset((filters.page - 1) * page_size)
+
+    fields = selected_fields(filters)
+    if fields is not None:
+        # the cursor of a scan_date ordered page reads it too
+        extra = {"scan_date"} if filters.order_by == ListingOrder.scan_date else set()
+        page_query = page_query.options(load_only_fields(fields, extra))
+
+    # a cursor walk is not counted unless asked for: the keyset predicate hides
+    # the previous pages from the page query, so the total is a separate scan
+    # of the whole filtered set on every page
+    count = filters.count or (CountMode.none if filters.cursor else CountMode.exact)
+
+    total_count = None
+    if count == CountMode.exact and not filters.cursor:
+        # fold the exact count into the page query, counted before LIMIT/OFFSET
+        rows = page_query.add_columns(func.count().over()).limit(page_size + 1).all()
+        listings = [listing for listing, _ in rows]
+        if rows:
+            total_count = rows[0][1]
+        elif filters.page > 1:
+            # page past the end, the window has no row to report the count on
+            total_count = query.count()
+        else:
+            total_count = 0
+    else:
+        # fetch one extra row to know whether there is a next page
+        listings = page_query.limit(page_size + 1).all()
+        if count == CountMode.exact:
+            total_count = query.count()
+        elif count == CountMode.estimated:
+            total_count = estimate_count(db, query)
+
+    next_cursor = None
+    if len(listings) > page_size:
+        listings = listings[:page_size]
+        next_cursor = encode_cursor(listings[-1], filters.order_by)
+
+    return listings, total_count, next_cursor
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def estimate_count(db: Session, query) -> int:
+    # the planner's row estimate, without executing the query
+    plan = db.execute(Explain(query.statement)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def encode_cursor(listing: Listing, order_by: ListingOrder) -> str:
+    key = {"o": order_by.value, "id": listing.listing_id}
+    if order_by == ListingOrder.scan_date:
+        key["d"] = listing.scan_date.isoformat() if listing.scan_date else None
+    raw = json.dumps(key, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order_by: ListingOrder) -> Dict[str, Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        listing_id = key["id"]
+        scan_date = key.get("d")
+        if key["o"] != order_by.value:
+            raise ValueError(f"cursor was issued for order_by={key['o']}")
+        return {
+            "listing_id": listing_id,
+            "scan_date": datetime.fromisoformat(scan_date) if scan_date else None,
+        }
+    except (ValueError, KeyError, TypeError, binascii.Error) as e:
+        raise ValueError(f"malformed cursor: {e}")
+
+
+def _after_cursor(cursor: str, order_by: ListingOrder):
+    key = decode_cursor(cursor, order_by)
+
+    if order_by != ListingOrder.scan_date:
+        return Listing.listing_id > key["listing_id"]
+
+    # postgres sorts NULL scan dates last in ascending order
+    if key["scan_date"] is None:
+        return and_(Listing.scan_date.is_(None), Listing.listing_id > key["listing_id"])
+    return or_(
+        tuple_(Listing.scan_date, Listing.listing_id) > tuple_(key["scan_date"], key["listing_id"]),
+        Listing.scan_date.is_(None),
+    )
+
+
+def encode_change_token(change_seq: int, listing_id: str) -> str:
+    raw = json.dumps({"s": change_seq, "id": listing_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
 
-        # only keep listings that match all property filters
-        if listing_ids_sets:
-            matching_ids = set.intersection(*listing_ids_sets)
-            query = query.filter(Listing.listing_id.in_(matching_ids))
 
+def decode_change_token(token: str) -> Tuple[int, str]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return int(key["s"]), str(key["id"])
+    except (ValueError, KeyError, TypeError, binascii.Error) as e:
+        raise ValueError(f"malformed token: {e}")
 
-    listings = query.order_by(Listing.listing_id).offset((filters.page - 1) * 100).limit(100).all()
-    total_count = query.count()
+
+def get_listing_changes(
+    db: Session,
+    token: Optional[str] = None,
+    limit: int = CHANGES_PAGE_SIZE,
+    fields: Optional[Set[str]] = None
+) -> Dict[str, Any]:
+    # listings changed after the token's position, in (change_seq, listing_id)
+    # order from the change_seq index, so a poll costs what changed since the
+    # previous one. no token starts from the beginning
+    change_seq, listing_id = decode_change_token(token) if token else (-1, "")
+    query = with_documents(
+        db.query(Listing)
+        .filter(tuple_(Listing.change_seq, Listing.listing_id) > tuple_(change_seq, listing_id))
+        .order_by(Listing.change_seq, Listing.listing_id)
+    )
+    if fields is not None:
+        query = query.options(load_only_fields(fields, {"change_seq"}))
+
+    listings = query.limit(limit + 1).all()
+    has_more = len(listings) > limit
+    listings = listings[:limit]
+    if listings:
+        change_seq, listing_id = listings[-1].change_seq, listings[-1].listing_id
+
+    return {
+        "listings": listing_results(db, listings, fields),
+        "next_token": encode_change_token(change_seq, listing_id),
+        "has_more": has_more,
+    }
+
+
+def get_listings_version(db: Session) -> int:
+    version = db.execute(select(ListingsVersion.version).where(ListingsVersion.id == 1)).scalar()
+    return version or 0
+
+
+def bump_listings_version(db: Session) -> int:
+    # the row stays locked until the transaction ends
+    stmt = insert(ListingsVersion).values(id=1, version=1)
+    return db.execute(stmt.on_conflict_do_update(
+        index_elements=[ListingsVersion.id],
+        set_={"version": ListingsVersion.version + 1}
+    ).returning(ListingsVersion.version)).scalar()
+
+
+def listings_etag(version: int, filters: ListingFilters) -> str:
+    # changes whenever an upsert commits, and differs between filter sets.
+    # the version is read before the page, so a write landing in between only
+    # costs the client one more full response
+    return f'"{version}-{filters_digest(filters)[:16]}"'
+
+
+def load_only_fields(fields: Set[str], extra: Set[str] = frozenset()):
+    # only the columns the response needs, reading any other one raises
+    # instead of lazy loading it row by row
+    columns = {"listing_id"} | (fields & set(LISTING_COLUMNS)) | extra
+    if "entities" in fields:
+        columns.add("dataset_entity_ids")
+    return load_only(*(getattr(Listing, column) for column in columns), raiseload=True)
+
+
+def listing_id_in(listing_ids: List[str]):
+    # `listing_id = ANY(:listing_ids)`, one array parameter however many ids
+    return Listing.listing_id == any_(bindparam("listing_ids", list(listing_ids), type_=ARRAY(String)))
+
+
+def get_listings_by_ids(
+    db: Session,
+    listing_ids: List[str],
+    fields: Optional[Set[str]] = None
+) -> Dict[str, Any]:
+    # one `listing_id = ANY(:ids)` query and one hydration for the whole batch,
+    # results in request order with None for the ids that do not exist
+    unique_ids = list(dict.fromkeys(listing_ids))
+    query = with_documents(db.query(Listing).filter(listing_id_in(unique_ids)))
+    if fields is not None:
+        query = query.options(load_only_fields(fields))
+
+    results = listing_results(db, query.all(), fields)
+    by_id = {listing["listing_id"]: listing for listing in results}
+
+    return {
+        "listings": [by_id.get(listing_id) for listing_id in listing_ids],
+        "missing": [listing_id for listing_id in unique_ids if listing_id not in by_id],
+    }
+
+
+def selected_fields(filters: ListingFilters) -> Optional[Set[str]]:
+    # None when every field is returned
+    if not filters.fields:
+        return None
+    return {field.value for field in filters.fields}
+
+
+def response_shape(fields: Optional[Set[str]]) -> Tuple[List[str], bool, bool]:
+    # the scalar columns, and whether properties / entities are returned
+    if fields is None:
+        return list(LISTING_COLUMNS), True, True
+    columns = [column for column in LISTING_COLUMNS if column in fields]
+    return columns, "properties" in fields, "entities" in fields
+
+
+def hydrate_listings(
+    db: Session,
+    listings: List[Listing],
+    fields: Optional[Set[str]] = None
+) -> List[Dict[str, Any]]:
+    # load properties and entities for the whole page with one query each,
+    # then group them in memory by listing
+    if not listings:
+        return []
+
+    rows = {
+        key: db.execute(statement).all()
+        for key, statement in hydration_statements(listings, fields).items()
+    }
+
+    # property names come from the registry, only unknown ids hit test_properties
+    property_names = lookup_properties_by_id(db, hydrated_property_ids(rows))
+
+    return assemble_listings(listings, rows, property_names, fields)
+
+
+def hydration_statements(listings: List[Listing], fields: Optional[Set[str]] = None) -> Dict[str, Any]:
+    # independent of each other, so they can also run concurrently. the ones
+    # of fields left out of the response are skipped
+    listing_ids = [listing.listing_id for listing in listings]
+    statements = {}
+    if fields is None or "properties" in fields:
+        statements["str"] = select(
+            StringPropertyValue.listing_id, StringPropertyValue.property_id, StringPropertyValue.value
+        ).where(StringPropertyValue.listing_id.in_(listing_ids))
+        statements["bool"] = select(
+            BoolPropertyValue.listing_id, BoolPropertyValue.property_id, BoolPropertyValue.value
+        ).where(BoolPropertyValue.listing_id.in_(listing_ids))
+
+    if fields is not None and "entities" not in fields:
+        return statements
+
+    # dataset entities referenced by any listing of the page
+    entity_ids = {
+        entity_id
+        for listing in listings
+        for entity_id in (listing.dataset_entity_ids or [])
+    }
+    if entity_ids:
+        statements["entities"] = select(
+            DatasetEntity.entity_id, DatasetEntity.name, DatasetEntity.data
+        ).where(DatasetEntity.entity_id.in_(entity_ids))
+
+    return statements
+
+
+def hydrated_property_ids(rows: Dict[str, List[Any]]) -> Set[int]:
+    return {row.property_id for row in rows.get("str", [])} | {row.property_id for row in rows.get("bool", [])}
+
+
+def assemble_listings(
+    listings: List[Listing],
+    rows: Dict[str, List[Any]],
+    property_names: Dict[int, Tuple[str, str]],
+    fields: Optional[Set[str]] = None
+) -> List[Dict[str, Any]]:
+    properties_by_listing: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+
+    for prop_type in ("str", "bool"):
+        for listing_id, property_id, value in rows.get(prop_type, []):
+            if property_id not in property_names:
+                continue
+            properties_by_listing[listing_id].append({
+                "name": property_names[property_id][0],
+                "type": prop_type,
+                "value": value
+            })
+
+    entities_by_id = {
+        entity_id: {
+            "name": name,
+            "data": data
+        } for entity_id, name, data in rows.get("entities", [])
+    }
+
+    columns, with_properties, with_entities = response_shape(fields)
 
     results = []
 
     for listing in listings:
-        # collect properties
-        properties = []
-        # string properties
-        str_props = db.query(Property, StringPropertyValue).join(
-            StringPropertyValue, Property.property_id == StringPropertyValue.property_id
-        ).filter(StringPropertyValue.listing_id == listing.listing_id).all()
-
-        for prop, val in str_props:
-            properties.append({
-                "name": prop.name,
-                "type": "str",
-                "value": val.value
-            })
+        result = {"listing_id": listing.listing_id}
+        for column in columns:
+            result[column] = getattr(listing, column)
 
-        # boolean properties
-        bool_props = db.query(Property, BoolPropertyValue).join(
-            BoolPropertyValue, Property.property_id == BoolPropertyValue.property_id
-        ).filter(BoolPropertyValue.listing_id == listing.listing_id).all()
+        if with_properties:
+            result["properties"] = properties_by_listing.get(listing.listing_id, [])
 
-        for prop, val in bool_props:
-            properties.append({
-                "name": prop.name,
-                "type": "bool",
-                "value": val.value
-            })
+        if with_entities:
+            entity_ids_of_listing = list(dict.fromkeys(listing.dataset_entity_ids or []))
+            result["entities"] = [
+                entities_by_id[entity_id]
+                for entity_id in entity_ids_of_listing
+                if entity_id in entities_by_id
+            ]
 
-        # dataset entities
-        entities = db.query(DatasetEntity).filter(
-            DatasetEntity.entity_id.in_(listing.dataset_entity_ids)
-        ).all()
+        results.append(result)
+
+    return results
 
-        entities_data = [
-            {
-                "name": entity.name,
-                "data": entity.data
-            } for entity in entities
-        ]
 
-        results.append({
+def upsert_listings( db: Session, data: ListingsInsertRequest):
+    # set-based upsert: every table is written with one multi-row
+    # INSERT ... ON CONFLICT statement and the whole payload is one transaction.
+    # when the payload repeats a listing, entity or property value the last
+    # occurrence wins, as it did when listings were applied one by one
+    if not data.listings:
+        return
+
+    partitioned = ensure_partitions(db, (listing.scan_date for listing in data.listings))
+    entity_ids, changed_entity_ids = _upsert_entities(db, data)
+    properties = _resolve_properties(db, data)
+    property_ids = {name: property_id for name, (property_id, _) in properties.items()}
+
+    listing_rows = {}
+    value_rows = {"str": {}, "bool": {}}
+    for listing in data.listings:
+        listing_rows[listing.listing_id] = {
             "listing_id": listing.listing_id,
             "scan_date": listing.scan_date,
             "is_active": listing.is_active,
-            "dataset_entity_ids": listing.dataset_entity_ids,
             "image_hashes": listing.image_hashes,
-            "properties": properties,
-            "entities": entities_data
-        })
+            "dataset_entity_ids": [entity_ids[entity.name] for entity in listing.entities],
+        }
+        for prop in listing.properties:
+            property_id = property_ids[prop.name]
+            value_rows[prop.type.value][(listing.listing_id, property_id)] = {
+                "listing_id": listing.listing_id,
+                "property_id": property_id,
+                "value": prop.value,
+            }
+
+    # every table is written in key order, so concurrent upserts lock
+    # overlapping rows in the same order and cannot deadlock
+    listing_ids = sorted(listing_rows)
+    touched_ids = lock_listings(db, listing_ids, changed_entity_ids)
+    _write_listings(db, [listing_rows[listing_id] for listing_id in listing_ids], partitioned)
+
+    for prop_type, value_table in (("str", StringPropertyValue.__table__), ("bool", BoolPropertyValue.__table__)):
+        rows = [value_rows[prop_type][key] for key in sorted(value_rows[prop_type])]
+        if not rows:
+            continue
+        stmt = insert(value_table)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[value_table.c.listing_id, value_table.c.property_id],
+                set_={"value": stmt.excluded.value}
+            ),
+            rows
+        )
 
-    return ListingsResponse(listings=results, total=total_count)
+    mark_listings_changed(db, touched_ids)
+    db.commit()
+
+    # the names are committed now, share them with the other requests
+    entities_by_name.set_many(entity_ids)
+    remember_properties(properties)
+    # cached responses may include the rows just written
+    listings_cache.invalidate()
+    facets_cache.invalidate()
+
+
+def lock_listings(db: Session, listing_ids: List[str], changed_entity_ids: List[int]) -> List[str]:
+    # locks the existing listings among `listing_ids` and every listing showing
+    # an entity whose data changed, in listing_id order, before anything is
+    # written to them. returns both: the listings whose change_seq moves
+    condition = listing_id_in(listing_ids)
+    if changed_entity_ids:
+        condition = or_(condition, Listing.dataset_entity_ids.overlap(changed_entity_ids))
+    locked = db.execute(
+        select(Listing.listing_id).where(condition).order_by(Listing.listing_id).with_for_update()
+    ).scalars().all()
+    written = set(listing_ids)
+    return list(listing_ids) + [listing_id for listing_id in locked if listing_id not in written]
+
+
+def mark_listings_changed(db: Session, touched_ids: List[str]):
+    # the end of every write, before the commit: refreshes the documents and
+    # change_seq of the listings returned by lock_listings
+    if use_listing_documents():
+        refresh_listing_documents(db, listing_id_in(touched_ids))
+
+    # last, so concurrent writers only queue on the version row for the
+    # moment it takes to commit. holding it while change_seq is set makes
+    # change_seq increase in commit order
+    version = bump_listings_version(db)
+    db.execute(update(Listing).where(listing_id_in(touched_ids)).values(change_seq=version))
+
+
+def lock_listing_ids(db: Session, listing_ids: List[str]):
+    # transaction level advisory locks, in id order so writers cannot deadlock
+    db.execute(
+        text(
+            "SELECT count(pg_advisory_xact_lock(hashtextextended(listing_id, 0))) "
+            "FROM (SELECT unnest(CAST(:listing_ids AS varchar[])) AS listing_id ORDER BY 1) AS ids"
+        ),
+        {"listing_ids": sorted(listing_ids)}
+    )
+
+
+def _write_listings(db: Session, rows: List[Dict[str, Any]], partitioned: bool):
+    listings_table = Listing.__table__
+    if not partitioned:
+        stmt = insert(listings_table)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[listings_table.c.listing_id],
+                set_={
+                    "scan_date": stmt.excluded.scan_date,
+                    "is_active": stmt.excluded.is_active,
+                    "image_hashes": stmt.excluded.image_hashes,
+                    "dataset_entity_ids": stmt.excluded.dataset_entity_ids,
+                }
+            ),
+            rows
+        )
+        return
+
+    # a partitioned test_listings has no unique index on listing_id to
+    # conflict on. a transaction lock per listing id, taken in id order, keeps
+    # two upserts from both inserting the same new listing; existing listings
+    # are updated, and move partition when their month changes
+    listing_ids = [row["listing_id"] for row in rows]
+    lock_listing_ids(db, listing_ids)
+    existing = set(db.execute(select(Listing.listing_id).where(listing_id_in(listing_ids))).scalars())
+    updated = [
+        {f"b_{key}": value for key, value in row.items()}
+        for row in rows if row["listing_id"] in existing
+    ]
+    if updated:
+        db.execute(
+            listings_table.update()
+            .where(listings_table.c.listing_id == bindparam("b_listing_id"))
+            .values({column: bindparam(f"b_{column}") for column in LISTING_COLUMNS}),
+            updated
+        )
+    inserted = [row for row in rows if row["listing_id"] not in existing]
+    if inserted:
+        db.execute(insert(listings_table), inserted)
 
 
-def upsert_listings( db: Session, data: ListingsInsertRequest):
+def _upsert_entities(db: Session, data: ListingsInsertRequest) -> Tuple[Dict[str, int], List[int]]:
+    # name -> entity_id of the payload's entities, and the ids of the ones
+    # inserted or whose data changed
+    # name -> data, the last occurrence in the payload wins
+    entity_data = {}
     for listing in data.listings:
-        # upsert Listing
-        existing_listing = db.query(Listing).filter_by(listing_id=listing.listing_id).first()
-
-        # resolve entities first to get their IDs
-        entity_ids = []
         for entity in listing.entities:
-            entity_obj = db.query(DatasetEntity).filter_by(name=entity.name).first()
-            if not entity_obj:
-                entity_obj = DatasetEntity(name=entity.name, data=entity.data)
-                db.add(entity_obj)
-                db.flush()
-            else:
-                # update data if changed
-                if entity_obj.data != entity.data:
-                    entity_obj.data = entity.data
-            entity_ids.append(entity_obj.entity_id)
-
-        if not existing_listing:
-            new_listing = Listing(
-                listing_id=listing.listing_id,
-                scan_date=listing.scan_date,
-                is_active=listing.is_active,
-                image_hashes=listing.image_hashes,
-                dataset_entity_ids=entity_ids,
-            )
-            db.add(new_listing)
-        else:
-            existing_listing.scan_date = listing.scan_date
-            existing_listing.is_active = listing.is_active
-            existing_listing.image_hashes = listing.image_hashes
-            existing_listing.dataset_entity_ids = entity_ids
+            entity_data[entity.name] = entity.data
+    if not entity_data:
+        return {}, []
+
+    # insert new entities and update data if changed, only those rows come back.
+    # rows are locked in name order, the same in every writer
+    entities_table = DatasetEntity.__table__
+    stmt = insert(entities_table)
+    rows = db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[entities_table.c.name],
+            set_={"data": stmt.excluded.data},
+            where=entities_table.c.data.is_distinct_from(stmt.excluded.data)
+        ).returning(entities_table.c.name, entities_table.c.entity_id),
+        [{"name": name, "data": entity_data[name]} for name in sorted(entity_data)]
+    ).all()
+    entity_ids = {name: entity_id for name, entity_id in rows}
+    changed_entity_ids = list(entity_ids.values())
+
+    # unchanged entities already exist, resolve them through the registry
+    unchanged = entity_data.keys() - entity_ids.keys()
+    if unchanged:
+        entity_ids.update(lookup_entities_by_name(db, unchanged))
+
+    return entity_ids, changed_entity_ids
+
+
+def _resolve_properties(db: Session, data: ListingsInsertRequest) -> Dict[str, Tuple[int, str]]:
+    # name -> type, a property is created with the type it first appears with
+    property_types = {}
+    for listing in data.listings:
+        for prop in listing.properties:
+            property_types.setdefault(prop.name, 'string' if prop.type == 'str' else 'boolean')
+    if not property_types:
+        return {}
+
+    properties = lookup_properties_by_name(db, property_types)
+
+    missing = [
+        {"name": name, "type": property_types[name]}
+        for name in sorted(property_types)
+        if name not in properties
+    ]
+    if missing:
+        # a concurrent upsert may create the same names first: those are
+        # skipped here and read back once it has committed
+        properties_table = Property.__table__
+        stmt = insert(properties_table)
+        rows = db.execute(
+            stmt.on_conflict_do_nothing(index_elements=[properties_table.c.name]).returning(
+                properties_table.c.name, properties_table.c.property_id, properties_table.c.type
+            ),
+            missing
+        ).all()
+        properties.update({name: (property_id, prop_type) for name, property_id, prop_type in rows})
+        raced = [row["name"] for row in missing if row["name"] not in properties]
+        if raced:
+            properties.update(lookup_properties_by_name(db, raced))
 
-        db.flush()
+    return properties
 
-        # handle properties
-        for prop in listing.properties:
-            # upsert property definition
-            prop_obj = db.query(Property).filter_by(name=prop.name).first()
-            if not prop_obj:
-                prop_obj = Property(name=prop.name, type='string' if prop.type == 'str' else 'boolean')
-                db.add(prop_obj)
-                db.flush()
-
-            # upsert property value
-            if prop.type == 'str':
-                existing_val = db.query(StringPropertyValue).filter_by(
-                    listing_id=listing.listing_id, property_id=prop_obj.property_id
-                ).first()
-                if not existing_val:
-                    db.add(StringPropertyValue(
-                        listing_id=listing.listing_id,
-                        property_id=prop_obj.property_id,
-                        value=prop.value
-                    ))
-                else:
-                    existing_val.value = prop.value
-            elif prop.type == 'bool':
-                existing_val = db.query(BoolPropertyValue).filter_by(
-                    listing_id=listing.listing_id, property_id=prop_obj.property_id
-                ).first()
-                if not existing_val:
-                    db.add(BoolPropertyValue(
-                        listing_id=listing.listing_id,
-                        property_id=prop_obj.property_id,
-                        value=prop.value
-                    ))
-                else:
-                    existing_val.value = prop.value
-
-        db.commit()
\ No newline at end of file
+
+## Listing documents
+
+def use_listing_documents() -> bool:
+    # LISTING_DOCUMENTS=true keeps test_listing_documents up to date on upsert
+    # and serves GET /listings pages from it. turn it on in every process that
+    # writes listings, after a backfill with rebuild_listing_documents.py
+    return os.getenv("LISTING_DOCUMENTS", "false").lower() in ("1", "true", "yes")
+
+
+def listing_document(listing: Dict[str, Any]) -> Dict[str, Any]:
+    # a hydrated listing with JSON types only, as stored in the document
+    return {
+        **listing,
+        "scan_date": listing["scan_date"].isoformat() if listing["scan_date"] else None,
+    }
+
+
+def with_documents(query):
+    # the precomputed documents come with the listing rows, primary key join
+    if not use_listing_documents():
+        return query
+    return query.outerjoin(Listing.document).options(contains_eager(Listing.document))
+
+
+def listing_results(
+    db: Session,
+    listings: List[Listing],
+    fields: Optional[Set[str]] = None
+) -> List[Dict[str, Any]]:
+    # the response dicts of listings loaded through with_documents
+    if use_listing_documents():
+        return listings_from_documents(db, listings, fields)
+    return hydrate_listings(db, listings, fields)
+
+
+def write_listing_documents(db: Session, listings: List[Listing]):
+    # documents built by the same hydration as the regular read path
+    if not listings:
+        return
+    documents_table = ListingDocument.__table__
+    stmt = insert(documents_table)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[documents_table.c.listing_id],
+            set_={"document": stmt.excluded.document}
+        ),
+        [
+            {"listing_id": listing["listing_id"], "document": listing_document(listing)}
+            for listing in hydrate_listings(db, listings)
+        ]
+    )
+
+
+def refresh_listing_documents(db: Session, condition, batch_size: int = DOCUMENT_BATCH_SIZE) -> int:
+    # rebuild the documents of the listings matching `condition` in the
+    # current transaction, reading them from a server-side cursor batch by batch
+    result = db.execute(
+        select(Listing).where(condition).order_by(Listing.listing_id)
+        .execution_options(yield_per=batch_size, populate_existing=True)
+    )
+    refreshed = 0
+    for listings in result.scalars().partitions():
+        write_listing_documents(db, listings)
+        refreshed += len(listings)
+    return refreshed
+
+
+def rebuild_listing_documents(db: Session, batch_size: int = DOCUMENT_BATCH_SIZE) -> Iterable[int]:
+    # backfill of every document, one committed transaction per batch so it
+    # can run next to live traffic. yields the number of documents written so far
+    last_listing_id = None
+    rebuilt = 0
+    while True:
+        query = select(Listing).order_by(Listing.listing_id).limit(batch_size)
+        if last_listing_id is not None:
+            query = query.where(Listing.listing_id > last_listing_id)
+        listings = db.execute(query.execution_options(populate_existing=True)).scalars().all()
+        if not listings:
+            return
+        write_listing_documents(db, listings)
+        db.commit()
+        rebuilt += len(listings)
+        last_listing_id = listings[-1].listing_id
+        yield rebuilt
+
+
+def listings_from_documents(
+    db: Session,
+    listings: List[Listing],
+    fields: Optional[Set[str]] = None
+) -> List[Dict[str, Any]]:
+    # the page from the documents loaded with it, listings without one yet
+    # (written before LISTING_DOCUMENTS was on) are hydrated as usual
+    missing = [listing for listing in listings if listing.document is None]
+    hydrated = {
+        listing["listing_id"]: listing
+        for listing in hydrate_listings(db, missing, fields)
+    }
+
+    columns, with_properties, with_entities = response_shape(fields)
+
+    results = []
+    for listing in listings:
+        if listing.document is None:
+            results.append(hydrated[listing.listing_id])
+            continue
+
+        # jsonb does not keep key order, put the keys back in response order
+        document = listing.document.document
+        result = {"listing_id": listing.listing_id}
+        for column in columns:
+            result[column] = document[column]
+        if with_properties:
+            result["properties"] = [
+                {"name": prop["name"], "type": prop["type"], "value": prop["value"]}
+                for prop in document["properties"]
+            ]
+        if with_entities:
+            result["entities"] = [
+                {"name": entity["name"], "data": entity["data"]}
+                for entity in document["entities"]
+            ]
+        results.append(result)
+
+    return results
@@ -0,0 +1,82 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.api.schemas.listings_get import ListingsResponse, ListingFilters
+from app.api.schemas.listings_insert import ListingsInsertRequest
+from app.api.services.listings import (
+    assemble_listings,
+    fetch_listings_page,
+    hydrated_property_ids,
+    hydration_statements,
+    listings_from_documents,
+    selected_fields,
+    upsert_listings,
+    use_listing_documents,
+)
+from app.api.services.registry import lookup_properties_by_id
+from app.models.schemas import Listing
+
+
+# asyncio counterparts of the listing services. they reuse the sync query
+# building through AsyncSession.run_sync, which drives it on the asyncpg
+# connection without blocking the event loop
+
+
+async def get_listings_async(
+    db: AsyncSession,
+    filters: ListingFilters,
+    session_factory: Optional[async_sessionmaker] = None
+) -> ListingsResponse:
+    return ListingsResponse(**await get_listings_payload_async(db, filters, session_factory))
+
+
+async def get_listings_payload_async(
+    db: AsyncSession,
+    filters: ListingFilters,
+    session_factory: Optional[async_sessionmaker] = None
+) -> Dict[str, Any]:
+    listings, total_count, next_cursor = await db.run_sync(fetch_listings_page, filters)
+
+    if use_listing_documents():
+        results = await db.run_sync(listings_from_documents, listings, selected_fields(filters))
+    else:
+        results = await hydrate_listings_async(db, listings, session_factory, selected_fields(filters))
+
+    return {"total": total_count, "listings": results, "next_cursor": next_cursor}
+
+
+async def hydrate_listings_async(
+    db: AsyncSession,
+    listings: List[Listing],
+    session_factory: Optional[async_sessionmaker] = None,
+    fields: Optional[Set[str]] = None
+) -> List[Dict[str, Any]]:
+    if not listings:
+        return []
+
+    statements = hydration_statements(listings, fields)
+    if session_factory is None:
+        rows = {key: (await db.execute(statement)).all() for key, statement in statements.items()}
+    else:
+        # one connection per query so they run concurrently, each in its own
+        # snapshot which may be slightly newer than the page's. the page's
+        # read transaction ends first: holding its connection while waiting
+        # for more from the same pool starves the pool under concurrent requests
+        await db.commit()
+
+        async def fetch(statement):
+            async with session_factory() as session:
+                return (await session.execute(statement)).all()
+
+        results = await asyncio.gather(*(fetch(statement) for statement in statements.values()))
+        rows = dict(zip(statements, results))
+
+    property_names = await db.run_sync(lookup_properties_by_id, hydrated_property_ids(rows))
+
+    return assemble_listings(listings, rows, property_names, fields)
+
+
+async def upsert_listings_async(db: AsyncSession, data: ListingsInsertRequest):
+    await db.run_sync(upsert_listings, data)
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.schemas import DatasetEntity, Property
+
+REGISTRY_MAX_SIZE = int(os.getenv("REGISTRY_MAX_SIZE", "10000"))
+REGISTRY_TTL_SECONDS = float(os.getenv("REGISTRY_TTL_SECONDS", "300"))
+
+
+class NameRegistry:
+    # process-local, bounded (LRU) and expiring mapping shared across requests.
+    # only ever fill it with rows that are committed
+    def __init__(self, max_size: int = REGISTRY_MAX_SIZE, ttl: float = REGISTRY_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None or entry[0] < now:
+                    if entry is not None:
+                        del self._entries[key]
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry[1]
+                self.hits += 1
+        return found
+
+    def set_many(self, mapping: Dict[Hashable, Any]):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for key, value in mapping.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys: Optional[Iterable[Hashable]] = None):
+        with self._lock:
+            if keys is None:
+                self._entries.clear()
+                return
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# name -> (property_id, type) and property_id -> (name, type)
+properties_by_name = NameRegistry()
+properties_by_id = NameRegistry()
+# name -> entity_id
+entities_by_name = NameRegistry()
+
+
+def invalidate_registries():
+    properties_by_name.invalidate()
+    properties_by_id.invalidate()
+    entities_by_name.invalidate()
+
+
+def remember_properties(properties: Dict[str, Tuple[int, str]]):
+    properties_by_name.set_many(properties)
+    properties_by_id.set_many({
+        property_id: (name, prop_type) for name, (property_id, prop_type) in properties.items()
+    })
+
+
+def lookup_properties_by_name(db: Session, names: Iterable[str]) -> Dict[str, Tuple[int, str]]:
+    names = set(names)
+    found = properties_by_name.get_many(names)
+    missing = names - found.keys()
+    if missing:
+        rows = db.execute(
+            select(Property.name, Property.property_id, Property.type)
+            .where(Property.name.in_(missing))
+        ).all()
+        loaded = {name: (property_id, prop_type) for name, property_id, prop_type in rows}
+        remember_properties(loaded)
+        found.update(loaded)
+    return found
+
+
+def lookup_properties_by_id(db: Session, property_ids: Iterable[int]) -> Dict[int, Tuple[str, str]]:
+    property_ids = set(property_ids)
+    found = properties_by_id.get_many(property_ids)
+    missing = property_ids - found.keys()
+    if missing:
+        rows = db.execute(
+            select(Property.property_id, Property.name, Property.type)
+            .where(Property.property_id.in_(missing))
+        ).all()
+        loaded = {property_id: (name, prop_type) for property_id, name, prop_type in rows}
+        properties_by_id.set_many(loaded)
+        found.update(loaded)
+    return found
+
+
+def lookup_entities_by_name(db: Session, names: Iterable[str]) -> Dict[str, int]:
+    names = set(names)
+    found = entities_by_name.get_many(names)
+    missing = names - found.keys()
+    if missing:
+        loaded = dict(db.execute(
+            select(DatasetEntity.name, DatasetEntity.entity_id)
+            .where(DatasetEntity.name.in_(missing))
+        ).all())
+        entities_by_name.set_many(loaded)
+        found.update(loaded)
+    return found
@@ -0,0 +1,42 @@
+import json
+import os
+from datetime import date, datetime
+from typing import Any
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib encoder produces the same JSON
+    orjson = None
+
+
+def use_fast_responses() -> bool:
+    # LISTINGS_FAST_RESPONSES=false goes back to response_model validation
+    # and FastAPI's own encoder
+    return os.getenv("LISTINGS_FAST_RESPONSES", "true").lower() in ("1", "true", "yes")
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(value)
+        except orjson.JSONEncodeError:
+            # integers beyond 64 bits (entity data is free-form), the stdlib handles them
+            pass
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(Response):
+    # encodes plain dicts / lists straight to bytes. the content is trusted to
+    # already have the shape of the route's response_model, nothing validates it
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
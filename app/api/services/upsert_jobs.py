@@ -0,0 +1,249 @@
+import logging
+import os
+import threading
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.api.schemas.listings_insert import ListingsInsertRequest
+from app.api.services.listings import upsert_listings
+from app.models.database import get_session
+from app.models.schemas import UpsertJob
+
+logger = logging.getLogger(__name__)
+
+# only the first listing errors of a job are kept, the rest are counted
+MAX_REPORTED_ERRORS = 100
+# deadlock, serialization failure, lock timeout, unique violation: another
+# writer got in the way, the job is tried again later
+CONFLICT_CODES = {"40P01", "40001", "55P03", "23505"}
+ACTIVE_STATUSES = ("queued", "running")
+
+# the database clock, so workers on several hosts agree on it
+utc_now = func.timezone("UTC", func.now())
+
+
+def job_settings() -> Dict[str, Any]:
+    return {
+        "chunk_size": int(os.getenv("UPSERT_JOB_CHUNK_SIZE", "500")),
+        "max_attempts": int(os.getenv("UPSERT_JOB_MAX_ATTEMPTS", "5")),
+        "retry_seconds": float(os.getenv("UPSERT_JOB_RETRY_SECONDS", "5")),
+        "lease_seconds": float(os.getenv("UPSERT_JOB_LEASE_SECONDS", "300")),
+    }
+
+
+def max_queued_jobs() -> int:
+    # POST /upsert/jobs answers 429 once this many jobs are queued or running
+    return int(os.getenv("UPSERT_JOBS_MAX_QUEUED", "100"))
+
+
+def queue_depth(db: Session) -> int:
+    return db.execute(
+        select(func.count()).select_from(UpsertJob).where(UpsertJob.status.in_(ACTIVE_STATUSES))
+    ).scalar()
+
+
+def enqueue_upsert_job(db: Session, payload: ListingsInsertRequest) -> int:
+    job_id = db.execute(
+        insert(UpsertJob).values(
+            status="queued",
+            payload=payload.model_dump(mode="json"),
+            listing_count=len(payload.listings),
+            processed_count=0,
+            error_count=0,
+            errors=[],
+            attempts=0,
+            created_at=utc_now,
+            available_at=utc_now,
+        ).returning(UpsertJob.job_id)
+    ).scalar()
+    db.commit()
+    return job_id
+
+
+def get_upsert_job(db: Session, job_id: int) -> Optional[Dict[str, Any]]:
+    row = db.execute(
+        select(
+            UpsertJob.job_id, UpsertJob.status, UpsertJob.listing_count, UpsertJob.processed_count,
+            UpsertJob.error_count, UpsertJob.errors, UpsertJob.last_error, UpsertJob.attempts,
+            UpsertJob.created_at, UpsertJob.started_at, UpsertJob.finished_at,
+        ).where(UpsertJob.job_id == job_id)
+    ).mappings().first()
+    return dict(row) if row else None
+
+
+def is_conflict(err: SQLAlchemyError) -> bool:
+    return isinstance(err, DBAPIError) and getattr(err.orig, "pgcode", None) in CONFLICT_CODES
+
+
+def error_message(err: SQLAlchemyError) -> str:
+    # the driver's message, without the statement and its parameters
+    return str(getattr(err, "orig", None) or err).strip()
+
+
+def claim_next_job(db: Session, lease_seconds: float):
+    # the oldest job that is due, or running past its lease (its worker died).
+    # SKIP LOCKED lets every worker claim a different one
+    job = db.execute(
+        select(
+            UpsertJob.job_id, UpsertJob.payload, UpsertJob.processed_count,
+            UpsertJob.error_count, UpsertJob.errors, UpsertJob.attempts,
+        )
+        .where(UpsertJob.status.in_(ACTIVE_STATUSES), UpsertJob.available_at <= utc_now)
+        .order_by(UpsertJob.job_id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    ).mappings().first()
+    if job is None:
+        db.rollback()
+        return None
+    db.execute(
+        update(UpsertJob).where(UpsertJob.job_id == job["job_id"]).values(
+            status="running",
+            attempts=UpsertJob.attempts + 1,
+            started_at=func.coalesce(UpsertJob.started_at, utc_now),
+            available_at=utc_now + timedelta(seconds=lease_seconds),
+        )
+    )
+    db.commit()
+    return {**job, "attempts": job["attempts"] + 1}
+
+
+def process_next_job(db: Session) -> Optional[int]:
+    # applies the next due job with upsert_listings, chunk by chunk. returns its
+    # id, None when there is nothing to do
+    settings = job_settings()
+    job = claim_next_job(db, settings["lease_seconds"])
+    if job is None:
+        return None
+    job_id = job["job_id"]
+
+    if job["attempts"] > settings["max_attempts"]:
+        _finish_job(db, job_id, "failed", "Too many attempts.")
+        return job_id
+
+    try:
+        status, last_error = _run_job(db, job, settings)
+    except Exception as err:
+        db.rollback()
+        status, last_error = "failed", f"Unexpected error: {str(err)}"
+
+    if status == "queued":
+        # a conflict, tried again after a pause growing with the attempts
+        if job["attempts"] >= settings["max_attempts"]:
+            status = "failed"
+        else:
+            db.execute(update(UpsertJob).where(UpsertJob.job_id == job_id).values(
+                status="queued",
+                last_error=last_error,
+                available_at=utc_now + timedelta(seconds=settings["retry_seconds"] * job["attempts"]),
+            ))
+            db.commit()
+            return job_id
+    _finish_job(db, job_id, status, last_error)
+    return job_id
+
+
+def _run_job(db: Session, job: Dict[str, Any], settings: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+    listings = ListingsInsertRequest.model_validate(job["payload"]).listings
+    processed = job["processed_count"]
+    error_count = job["error_count"]
+    errors: List[Dict[str, str]] = list(job["errors"])
+
+    # resumes after the chunks a previous attempt committed
+    while processed < len(listings):
+        chunk = listings[processed:processed + settings["chunk_size"]]
+        try:
+            chunk_errors = _apply_chunk(db, chunk)
+        except SQLAlchemyError as err:
+            db.rollback()
+            return "queued", error_message(err)
+
+        processed += len(chunk)
+        error_count += len(chunk_errors)
+        errors += chunk_errors[:MAX_REPORTED_ERRORS - len(errors)]
+        # progress, and a new lease
+        db.execute(update(UpsertJob).where(UpsertJob.job_id == job["job_id"]).values(
+            processed_count=processed,
+            error_count=error_count,
+            errors=errors,
+            available_at=utc_now + timedelta(seconds=settings["lease_seconds"]),
+        ))
+        db.commit()
+    return "completed", None
+
+
+def _apply_chunk(db: Session, chunk) -> List[Dict[str, str]]:
+    # the chunk in one upsert. when it fails for something else than a
+    # conflict, listing by listing to find the ones at fault. conflicts raise
+    try:
+        upsert_listings(db, ListingsInsertRequest(listings=chunk))
+        return []
+    except SQLAlchemyError as err:
+        db.rollback()
+        if is_conflict(err):
+            raise
+
+    errors = []
+    for listing in chunk:
+        try:
+            upsert_listings(db, ListingsInsertRequest(listings=[listing]))
+        except SQLAlchemyError as err:
+            db.rollback()
+            if is_conflict(err):
+                raise
+            errors.append({"listing_id": listing.listing_id, "error": error_message(err)})
+    return errors
+
+
+def _finish_job(db: Session, job_id: int, status: str, last_error: Optional[str]):
+    db.execute(update(UpsertJob).where(UpsertJob.job_id == job_id).values(
+        status=status, last_error=last_error, finished_at=utc_now,
+    ))
+    db.commit()
+
+
+## Workers
+
+def upsert_job_worker_count() -> int:
+    # UPSERT_JOB_WORKERS threads per app process. off by default, the jobs are
+    # then left to upsert_job_worker.py
+    return int(os.getenv("UPSERT_JOB_WORKERS", "0"))
+
+
+class UpsertJobWorkers:
+    # a pool of threads, each processing one job at a time with its own session
+    def __init__(self, count: int, poll_seconds: float = 1.0, session_factory=get_session):
+        self.count = count
+        self.poll_seconds = poll_seconds
+        self.session_factory = session_factory
+        self.stopping = threading.Event()
+        self.threads: List[threading.Thread] = []
+
+    def start(self):
+        for index in range(self.count):
+            thread = threading.Thread(target=self.run, name=f"upsert-job-worker-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        # a job cut short is picked up again once its lease runs out
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def run(self):
+        while not self.stopping.is_set():
+            job_id = None
+            db = self.session_factory()
+            try:
+                job_id = process_next_job(db)
+            except Exception:
+                logger.exception("upsert job worker failed")
+            finally:
+                db.close()
+            if job_id is None:
+                self.stopping.wait(self.poll_seconds)
@@ -1,20 +1,36 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from app.api.router.listings import router as listings_router
+from app.api.router.metrics import router as metrics_router
 from fastapi.responses import JSONResponse
 from sqlalchemy.exc import SQLAlchemyError
 from starlette.status import HTTP_500_INTERNAL_SERVER_ERROR
 from fastapi.exceptions import RequestValidationError
 
 from app.api.exceptions.exceptions import NotFoundException
+from app.api.services.upsert_jobs import UpsertJobWorkers, upsert_job_worker_count
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # the workers applying the POST /upsert/jobs payloads
+    workers = UpsertJobWorkers(upsert_job_worker_count())
+    workers.start()
+    yield
+    workers.stop(timeout=5)
+
 
 app = FastAPI(
     title="Listings API",
     description="API to retrieve filtered listings with properties and dataset entities.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # include the listings endpoint
 app.include_router(listings_router, prefix="/api", tags=["Listings"])
+# pool, registry and cache statistics
+app.include_router(metrics_router, prefix="/api", tags=["Metrics"])
 
 
 ## General error handling
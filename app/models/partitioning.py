@@ -0,0 +1,218 @@
+import logging
+import os
+import time
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+# optional monthly range partitioning of test_listings by scan_date. the layout
+# is chosen by the alembic revision (alembic -x partition_listings=true upgrade head),
+# the app finds out which one it runs against from the catalog.
+#
+# a partitioned table cannot have a unique index without its partition key, so
+# in that layout listing_id has a plain index, the foreign keys pointing at
+# test_listings are dropped, and upsert_listings keeps listing_id unique itself.
+# the property value tables stay as they are: they have no scan_date and are
+# only ever read by listing_id
+
+LISTINGS_TABLE = "test_listings"
+DEFAULT_PARTITION = "test_listings_default"
+
+LISTING_INDEXES = (
+    ("ix_test_listings_listing_id", "(listing_id)"),
+    ("ix_test_listings_scan_date_listing_id", "(scan_date, listing_id)"),
+    ("ix_test_listings_image_hashes", "USING gin (image_hashes)"),
+    ("ix_test_listings_dataset_entity_ids", "USING gin (dataset_entity_ids)"),
+    ("ix_test_listings_change_seq_listing_id", "(change_seq, listing_id)"),
+)
+
+# tables with a foreign key on test_listings.listing_id in the plain layout
+REFERENCING_TABLES = ("test_property_values_str", "test_property_values_bool", "test_listing_documents")
+
+# serialises partition creation, a (int, int) key so it never meets the
+# per-listing bigint locks taken by upsert_listings
+PARTITION_LOCK = "SELECT pg_advisory_xact_lock(hashtext('test_listings_partitions'), 0)"
+
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+def partition_lock_settings() -> Tuple[int, int]:
+    # creating a partition waits for every reader of the default partition (a
+    # long export, ...) and every read queues behind it meanwhile, so it only
+    # waits this long, this many times
+    return (
+        int(os.getenv("PARTITION_LOCK_TIMEOUT_MS", "200")),
+        int(os.getenv("PARTITION_CREATE_ATTEMPTS", "3")),
+    )
+
+
+def month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{LISTINGS_TABLE}_p{month.year:04d}_{month.month:02d}"
+
+
+def listing_partitions(connection) -> Optional[List[Tuple[str, str]]]:
+    # (name, bounds) of the attached partitions, None when test_listings is a plain table
+    is_partitioned = connection.execute(
+        text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": LISTINGS_TABLE}
+    ).scalar()
+    if not is_partitioned:
+        return None
+    return [tuple(row) for row in connection.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"
+    ), {"table": LISTINGS_TABLE})]
+
+
+def create_partition(connection, month: date):
+    name = partition_name(month)
+    bounds = f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+    in_month = f"scan_date >= '{month.isoformat()}' AND scan_date < '{next_month(month).isoformat()}'"
+    stray = connection.execute(text(
+        f"SELECT to_regclass('{name}') IS NULL AND to_regclass('{DEFAULT_PARTITION}') IS NOT NULL "
+        f"AND EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_month})"
+    )).scalar()
+    if not stray:
+        connection.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {LISTINGS_TABLE} {bounds}"))
+        return
+    # listings of the month written to the default partition while the
+    # partition could not be created are moved into it, attaching fails otherwise
+    connection.execute(text(f"CREATE TABLE {name} (LIKE {LISTINGS_TABLE} INCLUDING DEFAULTS)"))
+    connection.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_month} RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ))
+    connection.execute(text(f"ALTER TABLE {LISTINGS_TABLE} ATTACH PARTITION {name} {bounds}"))
+
+
+def ensure_partitions(db: Session, scan_dates: Iterable[Optional[datetime]]) -> bool:
+    # creates the partitions of the months that do not have one yet, returns
+    # whether test_listings is partitioned. one catalog query when nothing is missing
+    partitions = listing_partitions(db)
+    if partitions is None:
+        return False
+    existing = {name for name, _ in partitions}
+    missing = {month_start(scan_date) for scan_date in scan_dates if scan_date is not None}
+    missing = {month for month in missing if partition_name(month) not in existing}
+    if not missing:
+        return True
+
+    timeout_ms, attempts = partition_lock_settings()
+    for attempt in range(1, attempts + 1):
+        try:
+            _create_partitions(db, missing, timeout_ms)
+            return True
+        except OperationalError as err:
+            if getattr(err.orig, "pgcode", None) != LOCK_NOT_AVAILABLE:
+                raise
+            if attempt < attempts:
+                time.sleep(timeout_ms / 1000 * attempt)
+    # the listings go to the default partition, the next write of one of these
+    # months tries again and moves them out
+    logger.warning(
+        "could not lock test_listings to create %s, writing to %s",
+        ", ".join(partition_name(month) for month in sorted(missing)), DEFAULT_PARTITION
+    )
+    return True
+
+
+def _create_partitions(db: Session, months: Set[date], timeout_ms: int):
+    def create(connection):
+        connection.execute(text("SELECT set_config('lock_timeout', :timeout, true)"), {"timeout": f"{timeout_ms}ms"})
+        connection.execute(text(PARTITION_LOCK))
+        for month in sorted(months):
+            create_partition(connection, month)
+
+    # creating a partition locks the whole table, so it gets its own short
+    # transaction instead of holding the lock until the upsert commits
+    bind = db.get_bind()
+    if isinstance(bind, Engine):
+        with bind.begin() as connection:
+            create(connection)
+    else:
+        # inside the caller's transaction, a savepoint keeps a timeout from aborting it
+        previous = db.execute(text("SELECT current_setting('lock_timeout')")).scalar()
+        with db.begin_nested():
+            create(db)
+        db.execute(text("SELECT set_config('lock_timeout', :timeout, true)"), {"timeout": previous})
+
+
+def detach_partition(connection, name: str, archive_schema: Optional[str] = None, purge: bool = False):
+    # detached listings drop out of every read. their property values and
+    # documents are only deleted with purge, the values are not partitioned
+    connection.execute(text(f"ALTER TABLE {LISTINGS_TABLE} DETACH PARTITION {name}"))
+    if purge:
+        for table in REFERENCING_TABLES:
+            connection.execute(text(f"DELETE FROM {table} WHERE listing_id IN (SELECT listing_id FROM {name})"))
+    if archive_schema:
+        connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}"))
+        connection.execute(text(f"ALTER TABLE {name} SET SCHEMA {archive_schema}"))
+
+
+def _create_listing_indexes(connection):
+    for name, columns in LISTING_INDEXES:
+        connection.execute(text(f"CREATE INDEX {name} ON {LISTINGS_TABLE} {columns}"))
+
+
+def partition_listings(connection: Connection):
+    # plain -> partitioned. the rows are copied once and the indexes built
+    # after the copy, the table is locked for the whole time
+    for table, constraint in connection.execute(text(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+        "WHERE confrelid = to_regclass(:table) AND contype = 'f'"
+    ), {"table": LISTINGS_TABLE}).all():
+        connection.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT {constraint}"))
+
+    connection.execute(text(f"ALTER TABLE {LISTINGS_TABLE} RENAME TO {LISTINGS_TABLE}_unpartitioned"))
+    connection.execute(text(
+        f"CREATE TABLE {LISTINGS_TABLE} (LIKE {LISTINGS_TABLE}_unpartitioned INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (scan_date)"
+    ))
+    # listings without a scan_date
+    connection.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {LISTINGS_TABLE} DEFAULT"))
+    months = connection.execute(text(
+        f"SELECT DISTINCT date_trunc('month', scan_date)::date FROM {LISTINGS_TABLE}_unpartitioned "
+        "WHERE scan_date IS NOT NULL"
+    )).scalars().all()
+    for month in months:
+        create_partition(connection, month)
+
+    connection.execute(text(f"INSERT INTO {LISTINGS_TABLE} SELECT * FROM {LISTINGS_TABLE}_unpartitioned"))
+    connection.execute(text(f"DROP TABLE {LISTINGS_TABLE}_unpartitioned"))
+    _create_listing_indexes(connection)
+
+
+def unpartition_listings(connection: Connection):
+    # partitioned -> plain, the attached partitions are copied back. detached
+    # (archived) partitions are left alone
+    connection.execute(text(f"ALTER TABLE {LISTINGS_TABLE} RENAME TO {LISTINGS_TABLE}_partitioned"))
+    connection.execute(text(
+        f"CREATE TABLE {LISTINGS_TABLE} (LIKE {LISTINGS_TABLE}_partitioned INCLUDING DEFAULTS)"
+    ))
+    connection.execute(text(f"INSERT INTO {LISTINGS_TABLE} SELECT * FROM {LISTINGS_TABLE}_partitioned"))
+    connection.execute(text(f"DROP TABLE {LISTINGS_TABLE}_partitioned"))
+
+    connection.execute(text(f"ALTER TABLE {LISTINGS_TABLE} ADD CONSTRAINT {LISTINGS_TABLE}_pkey PRIMARY KEY (listing_id)"))
+    _create_listing_indexes(connection)
+    for table in REFERENCING_TABLES:
+        if connection.execute(text("SELECT to_regclass(:table) IS NOT NULL"), {"table": table}).scalar():
+            connection.execute(text(
+                f"ALTER TABLE {table} ADD CONSTRAINT {table}_listing_id_fkey "
+                f"FOREIGN KEY (listing_id) REFERENCES {LISTINGS_TABLE} (listing_id)"
+            ))
@@ -0,0 +1,53 @@
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy.engine import make_url
+
+
+class ReplicaSet:
+    # read replicas picked round-robin. a replica that fails to hand out a
+    # connection is skipped for `retry_seconds`, then tried again
+    def __init__(self, urls: List[str], make_engine: Callable, make_async_engine: Callable, retry_seconds: float = 30):
+        self.urls = urls
+        self.retry_seconds = retry_seconds
+        self._make_engine = make_engine
+        self._make_async_engine = make_async_engine
+        self._engines: Dict[Tuple[int, bool], object] = {}
+        self._unhealthy_until = [0.0] * len(urls)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.urls)
+
+    def candidates(self) -> List[int]:
+        # healthy replicas, starting with the next one in round-robin order
+        if not self.urls:
+            return []
+        start = next(self._counter) % len(self.urls)
+        now = time.monotonic()
+        order = [(start + offset) % len(self.urls) for offset in range(len(self.urls))]
+        return [index for index in order if self._unhealthy_until[index] <= now]
+
+    def mark_unhealthy(self, index: int):
+        self._unhealthy_until[index] = time.monotonic() + self.retry_seconds
+
+    def is_healthy(self, index: int) -> bool:
+        return self._unhealthy_until[index] <= time.monotonic()
+
+    def engine(self, index: int, is_async: bool = False):
+        key = (index, is_async)
+        with self._lock:
+            if key not in self._engines:
+                url = self.urls[index]
+                if is_async:
+                    self._engines[key] = self._make_async_engine(make_url(url).set(drivername="postgresql+asyncpg"))
+                else:
+                    self._engines[key] = self._make_engine(url)
+            return self._engines[key]
+
+    def created_engines(self) -> Dict[Tuple[int, bool], object]:
+        with self._lock:
+            return dict(self._engines)
@@ -1,4 +1,5 @@
 from sqlalchemy import (
+    BigInteger,
     CheckConstraint,
     Column,
     String,
@@ -6,9 +7,9 @@ from sqlalchemy import (
     Boolean,
     DateTime,
     ForeignKey,
-    JSON,
+    Index,
 )
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -22,17 +23,32 @@ class Listing(Base):
     is_active = Column(Boolean)
     dataset_entity_ids = Column(ARRAY(Integer))
     image_hashes = Column(ARRAY(String))
+    # the listings version of the upsert that last wrote the listing, its
+    # property values or one of its entities. increases in commit order
+    change_seq = Column(BigInteger, nullable=False, server_default="0")
 
     # relationships (not FK-based due to array)
     str_properties = relationship("StringPropertyValue", back_populates="listing")
     bool_properties = relationship("BoolPropertyValue", back_populates="listing")
+    # only loaded explicitly, by the page query when serving from documents
+    document = relationship("ListingDocument", uselist=False, lazy="raise")
+
+    __table_args__ = (
+        # keyset pagination ordered by scan date
+        Index("ix_test_listings_scan_date_listing_id", "scan_date", "listing_id"),
+        # array overlap (&&) filters
+        Index("ix_test_listings_image_hashes", "image_hashes", postgresql_using="gin"),
+        Index("ix_test_listings_dataset_entity_ids", "dataset_entity_ids", postgresql_using="gin"),
+        # the change feed, keyset ordered
+        Index("ix_test_listings_change_seq_listing_id", "change_seq", "listing_id"),
+    )
 
 
 class Property(Base):
     __tablename__ = "test_properties"
 
     property_id = Column(Integer, primary_key=True)
-    name = Column(String)
+    name = Column(String, unique=True)
     type = Column(String)
 
     # type must be either 'string' or 'boolean'
@@ -53,6 +69,11 @@ class StringPropertyValue(Base):
     listing = relationship("Listing", back_populates="str_properties")
     property = relationship("Property")
 
+    # property_filters lookups
+    __table_args__ = (
+        Index("ix_test_property_values_str_property_value_listing", "property_id", "value", "listing_id"),
+    )
+
 
 class BoolPropertyValue(Base):
     __tablename__ = "test_property_values_bool"
@@ -64,10 +85,71 @@ class BoolPropertyValue(Base):
     listing = relationship("Listing", back_populates="bool_properties")
     property = relationship("Property")
 
+    # property_filters lookups
+    __table_args__ = (
+        Index("ix_test_property_values_bool_property_value_listing", "property_id", "value", "listing_id"),
+    )
+
 
 class DatasetEntity(Base):
     __tablename__ = "test_dataset_entities"
 
     entity_id = Column(Integer, primary_key=True)
     name = Column(String, unique=True)
-    data = Column(JSON)
+    data = Column(JSONB)
+
+    # containment (@>) lookups of the dataset_entities filter
+    __table_args__ = (
+        Index(
+            "ix_test_dataset_entities_data", "data",
+            postgresql_using="gin", postgresql_ops={"data": "jsonb_path_ops"}
+        ),
+    )
+
+
+class ListingDocument(Base):
+    # a listing in the GET /listings response shape (JSON types, scan_date as
+    # an ISO string), rebuilt by every upsert that touches the listing or one
+    # of its entities when LISTING_DOCUMENTS is on
+    __tablename__ = "test_listing_documents"
+
+    listing_id = Column(String, ForeignKey("test_listings.listing_id"), primary_key=True)
+    document = Column(JSONB, nullable=False)
+
+
+class ListingsVersion(Base):
+    # a single row, bumped by every upsert. validator of the GET /listings ETag
+    __tablename__ = "test_listings_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+class UpsertJob(Base):
+    # a PUT /upsert payload accepted by POST /upsert/jobs, applied by the job
+    # workers. available_at is when a queued job may run, and the lease of a
+    # running one: a running job past it is picked up again
+    __tablename__ = "test_upsert_jobs"
+
+    job_id = Column(BigInteger, primary_key=True)
+    status = Column(String, nullable=False, default="queued")
+    payload = Column(JSONB, nullable=False)
+    listing_count = Column(Integer, nullable=False)
+    processed_count = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)
+    # [{"listing_id", "error"}], the first MAX_REPORTED_ERRORS only
+    errors = Column(JSONB, nullable=False, default=list)
+    last_error = Column(String)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False)
+    available_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        CheckConstraint(
+            "status IN ('queued', 'running', 'completed', 'failed')", name="check_upsert_job_status"
+        ),
+        # the workers' next-job lookup
+        Index("ix_test_upsert_jobs_status_available_at", "status", "available_at"),
+    )
@@ -0,0 +1,103 @@
+"""
+Cost of turning a page of hydrated listings into a response body.
+
+Compares the validated path (get_listings wraps the page in
+ListingsResponse, FastAPI validates it again against response_model and
+encodes it with the stdlib JSON encoder) with the fast path of GET
+/listings (the plain dicts encoded once by FastJSONResponse). The page is
+synthetic, no database is needed.
+
+    python -m benchmarks.listing_serialization --listings 100 --properties 20
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.api.schemas.listings_get import ListingsResponse
+from app.api.services import serialization
+from app.api.services.serialization import FastJSONResponse
+
+
+def make_payload(listings: int, properties: int, entities: int):
+    scan_date = datetime(2025, 1, 1)
+    entity_data = {
+        "category": "electronics",
+        "attributes": {"color": "black", "sizes": [38, 40, 42], "rating": 4.5},
+        "tags": [f"tag{i}" for i in range(10)],
+    }
+    return {
+        "total": 10_000,
+        "listings": [
+            {
+                "listing_id": f"listing-{n}",
+                "scan_date": scan_date + timedelta(minutes=n),
+                "is_active": n % 2 == 0,
+                "dataset_entity_ids": list(range(entities)),
+                "image_hashes": [f"{n:032x}", f"{n + 1:032x}"],
+                "properties": [
+                    {"name": f"property_{i}", "type": "str", "value": f"value {i}"} if i % 2
+                    else {"name": f"property_{i}", "type": "bool", "value": True}
+                    for i in range(properties)
+                ],
+                "entities": [{"name": f"entity_{i}", "data": entity_data} for i in range(entities)],
+            }
+            for n in range(listings)
+        ],
+        "next_cursor": "eyJvIjoibGlzdGluZ19pZCIsImlkIjoibGlzdGluZy05OSJ9",
+    }
+
+
+def validated_body(payload, adapter):
+    # get_listings, then FastAPI's response_model handling
+    response = ListingsResponse(**payload)
+    value = adapter.validate_python(response, from_attributes=True)
+    return JSONResponse(adapter.dump_python(value, mode="json")).body
+
+
+def fast_body(payload):
+    return FastJSONResponse(payload).body
+
+
+def time_runs(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), max(timings)
+
+
+def run(listings: int, properties: int, entities: int, repeat: int):
+    payload = make_payload(listings, properties, entities)
+    adapter = TypeAdapter(ListingsResponse)
+
+    candidates = [("validated", lambda: validated_body(payload, adapter))]
+    if serialization.orjson is not None:
+        candidates.append(("fast (orjson)", lambda: fast_body(payload)))
+    orjson, serialization.orjson = serialization.orjson, None
+    try:
+        # the same output without orjson installed
+        stdlib_ms = time_runs(lambda: fast_body(payload), repeat)
+    finally:
+        serialization.orjson = orjson
+
+    print(f"{listings} listings, {properties} properties and {entities} entities each, "
+          f"{len(fast_body(payload)) / 1024:.0f} KiB")
+    print(f"{'path':>16} {'p50/max ms':>18}")
+    for name, fn in candidates:
+        print(f"{name:>16} {'%.2f / %.2f' % time_runs(fn, repeat):>18}")
+    print(f"{'fast (stdlib)':>16} {'%.2f / %.2f' % stdlib_ms:>18}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listings", type=int, default=100)
+    parser.add_argument("--properties", type=int, default=20)
+    parser.add_argument("--entities", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    run(args.listings, args.properties, args.entities, args.repeat)
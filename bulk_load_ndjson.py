@@ -0,0 +1,53 @@
+import argparse
+import json
+import sys
+
+from sqlalchemy.orm import Session
+from app.models.database import get_session
+from app.api.services.bulk_load import BulkLoader, DEFAULT_CHUNK_SIZE
+
+
+def bulk_load_ndjson(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    db: Session = get_session()
+    loader = BulkLoader(db, chunk_size)
+
+    source = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        for line in source:
+            if loader.add_line(line):
+                print_chunk(loader.flush())
+        print_chunk(loader.flush())
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        db.close()
+
+    report = loader.report()
+    print(
+        f"Loaded {report['accepted']} listings ({report['rows']} rows) from {report['lines']} lines "
+        f"in {report['seconds']}s ({report['listings_per_second']} listings/s, "
+        f"{report['rows_per_second']} rows/s), {report['rejected']} rejected."
+    )
+    for rejection in report["rejections"]:
+        print(f"  line {rejection['line']}: {json.dumps(rejection['error'], default=str)}")
+
+
+def print_chunk(stats):
+    if stats is None:
+        return
+    status = f"FAILED: {stats['error']}" if stats["error"] else "ok"
+    print(
+        f"chunk {stats['batch']} lines {stats['first_line']}-{stats['last_line']}: "
+        f"{stats['listings']} listings, {stats['rows']} rows in {stats['seconds']}s "
+        f"({stats['rows_per_second']} rows/s) {status}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Bulk load listings from an NDJSON file (one InsertListingSchema per line) with COPY, for backfills."
+    )
+    parser.add_argument("path", help="NDJSON file, or - for stdin")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="listings per COPY and merge transaction")
+    args = parser.parse_args()
+    bulk_load_ndjson(args.path, args.chunk_size)
@@ -0,0 +1,18 @@
+#!/bin/sh
+# clones the primary on first start, then runs as a hot standby
+set -e
+
+mkdir -p "$PGDATA"
+chown postgres:postgres "$PGDATA"
+chmod 700 "$PGDATA"
+
+until pg_isready -h "$PRIMARY_HOST" -p 5432 -U postgres; do
+  sleep 1
+done
+
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+  su-exec postgres env PGPASSWORD=replicator \
+    pg_basebackup -h "$PRIMARY_HOST" -U replicator -D "$PGDATA" -R -X stream
+fi
+
+exec su-exec postgres postgres
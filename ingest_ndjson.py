@@ -0,0 +1,51 @@
+import argparse
+import json
+import sys
+
+from sqlalchemy.orm import Session
+from app.models.database import get_session
+from app.api.services.ingest import NdjsonIngestor, DEFAULT_BATCH_SIZE
+
+
+def ingest_ndjson(path: str, batch_size: int = DEFAULT_BATCH_SIZE):
+    db: Session = get_session()
+    ingestor = NdjsonIngestor(db, batch_size)
+
+    source = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        for line in source:
+            if ingestor.add_line(line):
+                print_batch(ingestor.flush())
+        print_batch(ingestor.flush())
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        db.close()
+
+    report = ingestor.report()
+    print(
+        f"Ingested {report['accepted']} listings from {report['lines']} lines "
+        f"in {report['seconds']}s ({report['listings_per_second']} listings/s), "
+        f"{report['rejected']} rejected."
+    )
+    for rejection in report["rejections"]:
+        print(f"  line {rejection['line']}: {json.dumps(rejection['error'], default=str)}")
+
+
+def print_batch(stats):
+    if stats is None:
+        return
+    status = f"FAILED: {stats['error']}" if stats["error"] else "ok"
+    print(
+        f"batch {stats['batch']} lines {stats['first_line']}-{stats['last_line']}: "
+        f"{stats['listings']} listings in {stats['seconds']}s "
+        f"({stats['listings_per_second']} listings/s) {status}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upsert listings from an NDJSON file, one InsertListingSchema per line.")
+    parser.add_argument("path", help="NDJSON file, or - for stdin")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+    ingest_ndjson(args.path, args.batch_size)
@@ -0,0 +1,83 @@
+import argparse
+from datetime import date
+
+from sqlalchemy.orm import Session
+from app.models.database import get_session
+from app.models.partitioning import create_partition, detach_partition, listing_partitions, partition_name
+from app.api.services.cache import facets_cache, listings_cache
+from app.api.services.listings import bump_listings_version
+
+
+def parse_month(value: str) -> date:
+    year, month = value.split("-")
+    return date(int(year), int(month), 1)
+
+
+def partitioned_session() -> Session:
+    db = get_session()
+    if listing_partitions(db) is None:
+        db.close()
+        raise SystemExit("test_listings is not partitioned, see alembic -x partition_listings=true upgrade head")
+    return db
+
+
+def list_partitions():
+    db = partitioned_session()
+    try:
+        for name, bounds in listing_partitions(db):
+            print(f"{name}  {bounds}")
+    finally:
+        db.close()
+
+
+def create_partitions(months):
+    # upserts create missing months themselves, this is for creating them ahead of time
+    db = partitioned_session()
+    try:
+        for month in months:
+            create_partition(db, month)
+            print(f"{partition_name(month)} ready")
+        db.commit()
+    finally:
+        db.close()
+
+
+def detach_partitions(before: date, archive_schema: str = None, purge: bool = False):
+    db = partitioned_session()
+    try:
+        names = [
+            name for name, _ in listing_partitions(db)
+            if name.startswith("test_listings_p") and name < partition_name(before)
+        ]
+        for name in names:
+            detach_partition(db, name, archive_schema, purge)
+            print(f"{name} detached" + (f" to {archive_schema}" if archive_schema else ""))
+        if names:
+            # the detached listings are gone from every read
+            bump_listings_version(db)
+        db.commit()
+    finally:
+        db.close()
+    if names:
+        listings_cache.invalidate()
+        facets_cache.invalidate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the monthly partitions of a partitioned test_listings.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="List the attached partitions.")
+    create_parser = commands.add_parser("create", help="Create the partitions of the given months (YYYY-MM).")
+    create_parser.add_argument("months", nargs="+", type=parse_month)
+    detach_parser = commands.add_parser("detach", help="Detach the partitions of the months before --before (YYYY-MM).")
+    detach_parser.add_argument("--before", required=True, type=parse_month)
+    detach_parser.add_argument("--archive-schema", help="Move the detached tables to this schema.")
+    detach_parser.add_argument("--purge", action="store_true", help="Also delete the property values and documents of the detached listings.")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        list_partitions()
+    elif args.command == "create":
+        create_partitions(args.months)
+    else:
+        detach_partitions(args.before, args.archive_schema, args.purge)
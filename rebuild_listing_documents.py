@@ -0,0 +1,29 @@
+import argparse
+import time
+
+from sqlalchemy.orm import Session
+from app.models.database import get_session
+from app.api.services.listings import rebuild_listing_documents, DOCUMENT_BATCH_SIZE
+
+
+def rebuild(batch_size: int = DOCUMENT_BATCH_SIZE):
+    db: Session = get_session()
+    started = time.perf_counter()
+    rebuilt = 0
+    try:
+        for rebuilt in rebuild_listing_documents(db, batch_size):
+            print(f"{rebuilt} documents rebuilt")
+    finally:
+        db.close()
+
+    seconds = time.perf_counter() - started
+    print(f"Rebuilt {rebuilt} listing documents in {seconds:.1f}s.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rebuild test_listing_documents from the listing tables, e.g. before turning LISTING_DOCUMENTS on."
+    )
+    parser.add_argument("--batch-size", type=int, default=DOCUMENT_BATCH_SIZE)
+    args = parser.parse_args()
+    rebuild(args.batch_size)
@@ -4,7 +4,9 @@ import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.models.schemas import Base
-from app.models.database import get_db
+from app.models.database import get_db, get_read_db
+from app.api.services.registry import invalidate_registries
+from app.api.services.cache import facets_cache, listings_cache
 from app.main import app
 from fastapi.testclient import TestClient
 import os
@@ -25,6 +27,15 @@ def setup_test_db():
     # drop tables after tests
     Base.metadata.drop_all(bind=engine)
 
+@pytest.fixture(autouse=True)
+def clear_registries():
+    # every test rolls back, ids cached by a previous test no longer exist
+    invalidate_registries()
+    listings_cache.clear()
+    facets_cache.clear()
+    yield
+
+
 @pytest.fixture()
 def db():
     connection = engine.connect()
@@ -46,4 +57,5 @@ def client(db):
             db.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     return TestClient(app)
@@ -0,0 +1,27 @@
+import argparse
+import signal
+
+from app.api.services.upsert_jobs import UpsertJobWorkers
+
+
+def run_workers(count: int, poll_seconds: float):
+    # applies POST /upsert/jobs payloads outside the API processes, until interrupted
+    workers = UpsertJobWorkers(count, poll_seconds)
+    signal.signal(signal.SIGTERM, lambda *_: workers.stopping.set())
+    workers.start()
+    print(f"{count} upsert job workers started.")
+    try:
+        while not workers.stopping.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    workers.stop()
+    print("Upsert job workers stopped.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run upsert job workers, outside the API processes.")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--poll-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+    run_workers(args.workers, args.poll_seconds)